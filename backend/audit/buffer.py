@@ -0,0 +1,194 @@
+"""
+In-memory buffer that writes audit events in batches.
+
+log_event() hands events to this process's buffer instead of inserting
+them inline; a flusher thread writes them with bulk_create once
+AUDIT_FLUSH_SIZE are waiting or every AUDIT_FLUSH_INTERVAL seconds, and
+once more at shutdown: on ASGI lifespan shutdown (see neora/asgi.py) and at
+interpreter exit, with SIGTERM turned into a normal exit in serving
+processes. The buffer holds at most AUDIT_BUFFER_MAX events; when it is
+full AUDIT_OVERFLOW_POLICY decides what happens:
+
+- write_through: the caller inserts its event inline (no loss, but the
+  request pays for the INSERT again while the database is behind)
+- drop_oldest: the oldest buffered event is discarded
+- drop_newest: the new event is discarded
+
+Events still buffered when the process is killed outright are lost. An
+event whose user was deleted while it waited is written with a null user,
+as on_delete=SET_NULL does for events already written.
+"""
+
+import atexit
+import logging
+import signal
+import sys
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, close_old_connections
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("neora_audit_events_buffered_total", "Audit events accepted into the write buffer")
+metrics.describe("neora_audit_events_flushed_total", "Audit events written by the buffer flusher")
+metrics.describe("neora_audit_events_dropped_total", "Audit events discarded by the overflow policy or a failed write")
+metrics.describe("neora_audit_events_write_through_total", "Audit events inserted inline because the buffer was full")
+metrics.describe("neora_audit_flush_seconds_total", "Time spent writing audit event batches")
+metrics.describe("neora_audit_buffer_depth", "Audit events waiting to be written")
+
+
+def write_event(fields):
+    from .models import AuditEvent
+
+    try:
+        AuditEvent.objects.create(**fields)
+    except IntegrityError:
+        user_id = fields.get("user_id")
+        if not user_id or get_user_model().objects.filter(pk=user_id).exists():
+            raise
+        # The user was deleted while the event sat in the buffer
+        AuditEvent.objects.create(**dict(fields, user_id=None))
+
+
+def write_events(events):
+    """bulk_create a batch; if it fails, retry row by row so one bad event cannot sink the rest."""
+    from .models import AuditEvent
+
+    try:
+        AuditEvent.objects.bulk_create([AuditEvent(**fields) for fields in events])
+        return len(events), 0
+    except Exception as e:
+        logger.warning(f"Audit batch of {len(events)} failed, writing events one by one: {e}")
+
+    written = 0
+    for fields in events:
+        try:
+            write_event(fields)
+            written += 1
+        except Exception as e:
+            logger.error(f"Dropping audit event {fields['event_type']}: {e}")
+    return written, len(events) - written
+
+
+class AuditBuffer:
+    def __init__(self):
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def put(self, fields):
+        """
+        Queue one event's field values.
+
+        Returns:
+            False if the caller must write the event itself (full buffer
+            under the write_through policy), True otherwise
+        """
+        policy = settings.AUDIT_OVERFLOW_POLICY
+        with self._lock:
+            if len(self._events) >= settings.AUDIT_BUFFER_MAX:
+                if policy == "write_through":
+                    metrics.incr("neora_audit_events_write_through_total")
+                    return False
+                metrics.incr("neora_audit_events_dropped_total", reason="overflow")
+                if policy == "drop_newest":
+                    return True
+                self._events.popleft()
+            self._events.append(fields)
+            depth = len(self._events)
+            self._start()
+        metrics.incr("neora_audit_events_buffered_total")
+        metrics.set_gauge("neora_audit_buffer_depth", depth)
+        if depth >= settings.AUDIT_FLUSH_SIZE:
+            self._wake.set()
+        return True
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="audit-flusher", daemon=True)
+            self._thread.start()
+
+    def flush(self):
+        """Write everything buffered so far; returns how many events were written."""
+        # One flusher at a time keeps batches in enqueue order
+        with self._flush_lock:
+            total = 0
+            while True:
+                with self._lock:
+                    count = min(len(self._events), settings.AUDIT_FLUSH_SIZE)
+                    batch = [self._events.popleft() for _ in range(count)]
+                    depth = len(self._events)
+                if not batch:
+                    break
+                started = time.perf_counter()
+                written, dropped = write_events(batch)
+                metrics.incr("neora_audit_flush_seconds_total", time.perf_counter() - started)
+                metrics.incr("neora_audit_events_flushed_total", written)
+                if dropped:
+                    metrics.incr("neora_audit_events_dropped_total", dropped, reason="error")
+                metrics.set_gauge("neora_audit_buffer_depth", depth)
+                total += written
+            return total
+
+    def _run(self):
+        while True:
+            self._wake.wait(settings.AUDIT_FLUSH_INTERVAL)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Audit flusher error: {e}")
+            finally:
+                close_old_connections()
+
+
+audit_buffer = AuditBuffer()
+
+
+@atexit.register
+def flush_on_exit():
+    if len(audit_buffer):
+        try:
+            written = audit_buffer.flush()
+            logger.info(f"Flushed {written} buffered audit events at shutdown")
+        except Exception as e:
+            logger.error(f"Could not flush audit events at shutdown: {e}")
+
+
+def install_sigterm_handler():
+    """
+    Make SIGTERM exit normally, so flush_on_exit() runs, then defer to
+    whatever handled it before.
+
+    The default action kills the process without running atexit hooks, so
+    with no previous handler SIGTERM becomes sys.exit(). A handler the
+    platform installed is still called; a server that installs its own
+    later (daphne) replaces this one and exits through its own path.
+    Called from neora/asgi.py, so management commands and tests keep the
+    default behaviour.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    if previous is signal.SIG_IGN:
+        return
+
+    def on_sigterm(signum, frame):
+        if callable(previous):
+            previous(signum, frame)
+        else:
+            sys.exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
@@ -1,6 +1,9 @@
 import logging
+from django.conf import settings
+from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth import get_user_model
+from .buffer import audit_buffer
 from .models import AuditEvent
 
 logger = logging.getLogger(__name__)
@@ -29,11 +32,31 @@ class AuditMiddleware(MiddlewareMixin):
             ip = request.META.get('REMOTE_ADDR')
         return ip
     
+    @staticmethod
+    def event_fields(user, event_type, request=None, metadata=None):
+        """Field values for an AuditEvent, timestamped now."""
+        fields = {
+            'user_id': user.pk if user else None,
+            'event_type': event_type,
+            'metadata': metadata or {},
+            'created_at': timezone.now(),
+        }
+
+        if request and hasattr(request, 'audit_context'):
+            fields.update({
+                'ip': request.audit_context['ip'],
+                'user_agent': request.audit_context['user_agent']
+            })
+        return fields
+
     @staticmethod
     def log_event(user, event_type, request=None, metadata=None):
         """
         Log an audit event.
-        
+
+        Buffered and written in batches unless AUDIT_BUFFERED is off or the
+        buffer is full under the write_through policy (see audit/buffer.py).
+
         Args:
             user: User instance or None
             event_type: String describing the event
@@ -41,29 +64,41 @@ class AuditMiddleware(MiddlewareMixin):
             metadata: Additional data to store (optional)
         """
         try:
-            audit_data = {
-                'user': user,
-                'event_type': event_type,
-                'metadata': metadata or {}
-            }
-            
-            if request and hasattr(request, 'audit_context'):
-                audit_data.update({
-                    'ip': request.audit_context['ip'],
-                    'user_agent': request.audit_context['user_agent']
-                })
-            
-            AuditEvent.objects.create(**audit_data)
-            
-            logger.info(f"Audit event logged: {event_type}", extra={
-                'user_id': str(user.id) if user else None,
-                'event_type': event_type,
-                'metadata': metadata
-            })
-            
+            fields = AuditMiddleware.event_fields(user, event_type, request, metadata)
+
+            if not (settings.AUDIT_BUFFERED and audit_buffer.put(fields)):
+                AuditEvent.objects.create(**fields)
+
+            AuditMiddleware._logged(user, event_type, metadata)
+
         except Exception as e:
-            logger.error(f"Failed to log audit event: {e}", extra={
-                'event_type': event_type,
-                'error': str(e)
-            })
+            AuditMiddleware._failed(event_type, e)
+
+    @staticmethod
+    async def alog_event(user, event_type, request=None, metadata=None):
+        """log_event() for async code: only an inline write leaves the event loop."""
+        try:
+            fields = AuditMiddleware.event_fields(user, event_type, request, metadata)
+
+            if not (settings.AUDIT_BUFFERED and audit_buffer.put(fields)):
+                await AuditEvent.objects.acreate(**fields)
+
+            AuditMiddleware._logged(user, event_type, metadata)
 
+        except Exception as e:
+            AuditMiddleware._failed(event_type, e)
+
+    @staticmethod
+    def _logged(user, event_type, metadata):
+        logger.info(f"Audit event logged: {event_type}", extra={
+            'user_id': str(user.id) if user else None,
+            'event_type': event_type,
+            'metadata': metadata
+        })
+
+    @staticmethod
+    def _failed(event_type, error):
+        logger.error(f"Failed to log audit event: {error}", extra={
+            'event_type': event_type,
+            'error': str(error)
+        })
@@ -1,3 +1,33 @@
-from django.test import TestCase
+import signal
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .buffer import install_sigterm_handler
+
+
+class SigtermHandlerTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(signal.signal, signal.SIGTERM, signal.getsignal(signal.SIGTERM))
+
+    def test_loading_the_app_leaves_sigterm_alone(self):
+        self.assertIs(signal.getsignal(signal.SIGTERM), signal.SIG_DFL)
+
+    def test_default_action_becomes_a_normal_exit(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        install_sigterm_handler()
+        with self.assertRaises(SystemExit) as cm:
+            signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+        self.assertEqual(cm.exception.code, 128 + signal.SIGTERM)
+
+    def test_previous_handler_is_chained(self):
+        previous = mock.Mock()
+        signal.signal(signal.SIGTERM, previous)
+        install_sigterm_handler()
+        signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+        previous.assert_called_once_with(signal.SIGTERM, None)
+
+    def test_ignored_sigterm_stays_ignored(self):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        install_sigterm_handler()
+        self.assertIs(signal.getsignal(signal.SIGTERM), signal.SIG_IGN)
@@ -0,0 +1,308 @@
+"""
+Native async versions of the hot chat endpoints.
+
+These run directly on the ASGI event loop under daphne: ORM access goes
+through Django's async ORM and the n8n call through a pooled async HTTP
+client, so a turn waiting on the assistant holds a coroutine instead of one
+of the server's sync worker threads. Responses keep DRF's shapes; the
+less frequent endpoints stay as DRF views in chat/views.py.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from core.auth import async_jwt_required
+from core.http import request_data
+from core.throttling import throttle
+from neora.db_router import aread_from_replica
+from . import views
+from .models import Message
+from .serializers import (
+    MessageSerializer,
+    MessageCreateSerializer,
+    MessageExportCreateSerializer,
+    VoiceUploadSerializer
+)
+from .services.export import CONTENT_TYPES, aiter_export, export_filename
+from .services.pipeline import complete_turn, start_turn
+from .services.local_delivery import is_local_echo, local_registry
+from .services.streaming import replay_events, user_group
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+@async_jwt_required
+async def messages_view(request):
+    """Handle both listing and creating messages."""
+    if request.method == 'GET':
+        return await list_messages(request)
+    return await create_message(request)
+
+
+async def list_messages(request):
+    user = request.user
+
+    try:
+        limit = int(request.GET.get('limit', 50))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be an integer.'}, status=400)
+    before = request.GET.get('before')  # ISO datetime string
+
+    queryset = Message.objects.filter(user=user)
+
+    if before:
+        try:
+            before_dt = parse_datetime(before)
+            if before_dt:
+                queryset = queryset.filter(created_at__lt=before_dt)
+        except ValueError:
+            pass
+
+    queryset = queryset.order_by('-created_at')[:limit]
+
+    async with aread_from_replica(user.id):
+        messages = [message async for message in queryset]
+
+    data = MessageSerializer(messages, many=True).data
+    return JsonResponse({
+        'results': data,
+        'count': len(data),
+        'next': None,  # Simplified pagination
+    })
+
+
+@throttle('messages')
+async def create_message(request):
+    try:
+        serializer = MessageCreateSerializer(data=request_data(request))
+    except ValueError as e:
+        return JsonResponse({'detail': f'JSON parse error - {e}'}, status=400)
+
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    user = request.user
+    message_text = serializer.validated_data['text']
+    language = serializer.validated_data.get('language', 'en')
+
+    try:
+        user_message, assistant_message = await start_turn(user, message_text, request=request)
+        await complete_turn(user, assistant_message, message_text, language, request=request)
+
+        return JsonResponse({
+            'user_message': MessageSerializer(user_message).data,
+            'assistant_message': MessageSerializer(assistant_message).data
+        }, status=201)
+
+    except Exception as e:
+        logger.error(f"Error creating message: {e}")
+        return JsonResponse({
+            'error': 'Failed to create message. Please try again.'
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+@async_jwt_required
+@throttle('voice')
+async def upload_voice(request):
+    """Upload voice file and send to N8N workflow."""
+    data = request.POST.dict()
+    if 'audio_file' in request.FILES:
+        data['audio_file'] = request.FILES['audio_file']
+
+    serializer = VoiceUploadSerializer(data=data)
+
+    if not serializer.is_valid():
+        logger.error(f"Voice upload validation failed: {serializer.errors}")
+        return JsonResponse(serializer.errors, status=400)
+
+    user = request.user
+    audio_file = serializer.validated_data['audio_file']
+    language = serializer.validated_data.get('language', 'en')
+
+    try:
+        file_extension = audio_file.name.split('.')[-1] if '.' in audio_file.name else 'webm'
+        filename = f"voice_messages/{user.id}/{uuid.uuid4()}.{file_extension}"
+
+        saved_path = await sync_to_async(default_storage.save)(filename, audio_file)
+        audio_url = default_storage.url(saved_path)
+        logger.info(f"Audio file saved successfully: {saved_path}, URL: {audio_url}")
+
+        # Ensure we have a full URL, not just a relative path
+        if audio_url.startswith('/'):
+            audio_url = f"{request.scheme}://{request.get_host()}{audio_url}"
+
+        user_message, assistant_message = await start_turn(
+            user, '[Voice Message]', audio_url=audio_url, request=request
+        )
+
+        # Reset file pointer to beginning in case it was read while saving
+        audio_file.seek(0)
+        await complete_turn(
+            user, assistant_message, '', language,
+            message_type='voice', audio_file=audio_file, request=request
+        )
+
+        return JsonResponse({
+            'user_message': MessageSerializer(user_message).data,
+            'assistant_message': MessageSerializer(assistant_message).data
+        }, status=201)
+
+    except Exception as e:
+        logger.error(f"Error creating voice message: {e}")
+        return JsonResponse({
+            'error': 'Failed to process voice message. Please try again.'
+        }, status=500)
+
+
+SSE_EVENT_TYPES = ('delta', 'done', 'error')
+
+
+def format_sse(event):
+    """Serialize a stream event as an SSE record; the id lets EventSource resume."""
+    lines = []
+    if event.get('message_id') and event.get('seq') is not None:
+        lines.append(f"id: {event['message_id']}:{event['seq']}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, ensure_ascii=False, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def parse_last_event_id(value):
+    """Split a "<message_id>:<seq>" event id; returns (None, 0) if malformed."""
+    message_id, _, seq = (value or '').rpartition(':')
+    try:
+        return (message_id or None), int(seq)
+    except ValueError:
+        return None, 0
+
+
+async def sse_events(user_id, last_event_id=None):
+    """
+    Yield the user's stream events as SSE until the client goes away.
+
+    Subscribes (in process and on a fresh channel in the same user group as
+    StreamConsumer) before replaying anything missed after Last-Event-ID,
+    so no event falls in between (one may arrive twice; clients drop ids
+    they have seen).
+    """
+    events = asyncio.Queue()
+    token = local_registry.register(user_id, events.put_nowait)
+
+    channel_layer = get_channel_layer()
+    channel = await channel_layer.new_channel()
+    group = user_group(user_id)
+    await channel_layer.group_add(group, channel)
+
+    async def pump_remote():
+        # Events published by other processes; ours arrive via the registry
+        while True:
+            message = await channel_layer.receive(channel)
+            if message.get('type') == 'stream_message' and not is_local_echo(message):
+                events.put_nowait(message['message'])
+
+    pump = asyncio.create_task(pump_remote())
+
+    try:
+        yield f"retry: {settings.SSE_RETRY_MS}\n\n"
+
+        message_id, last_seq = parse_last_event_id(last_event_id)
+        if message_id:
+            missed = await replay_events(user_id, message_id, last_seq)
+            if missed is None:
+                yield format_sse({
+                    'type': 'error',
+                    'code': 'resume_unavailable',
+                    'message': 'Stream is no longer available',
+                    'message_id': message_id
+                })
+            else:
+                for event in missed:
+                    yield format_sse(event)
+
+        started = time.monotonic()
+        while not settings.SSE_MAX_DURATION or time.monotonic() - started < settings.SSE_MAX_DURATION:
+            try:
+                event = await asyncio.wait_for(events.get(), timeout=settings.SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from timing out an idle stream
+                yield ": keepalive\n\n"
+                continue
+
+            if event.get('type') in SSE_EVENT_TYPES:
+                yield format_sse(event)
+    finally:
+        pump.cancel()
+        local_registry.unregister(user_id, token)
+        await channel_layer.group_discard(group, channel)
+        logger.debug(f"SSE stream closed for user {user_id}")
+
+
+@require_http_methods(['GET'])
+@async_jwt_required
+async def stream_events(request):
+    """
+    Server-Sent Events alternative to the stream websocket.
+
+    Emits the same delta/done/error events; resumes from the standard
+    Last-Event-ID header (or ?last_event_id= for the first connect).
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(
+        sse_events(request.user.id, last_event_id),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def export_messages(request):
+    """
+    Export the user's full conversation history.
+
+    GET streams the export directly (?fmt=ndjson|csv, ?gzip=1) from an async
+    generator, so the server never buffers the whole file. POST queues a
+    background export (views.queue_export).
+    """
+    if request.method == 'POST':
+        return await sync_to_async(views.queue_export)(request)
+    return await stream_export(request)
+
+
+@async_jwt_required
+async def stream_export(request):
+    serializer = MessageExportCreateSerializer(data={
+        'format': request.GET.get('fmt', 'ndjson'),
+        'compressed': request.GET.get('gzip', 'false'),
+    })
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    fmt = serializer.validated_data['format']
+    compressed = serializer.validated_data['compressed']
+
+    response = StreamingHttpResponse(
+        aiter_export(request.user.id, fmt, compressed),
+        content_type='application/gzip' if compressed else f"{CONTENT_TYPES[fmt]}; charset=utf-8"
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compressed)}"'
+    logger.info(f"Streaming {fmt} export for user {request.user.id} (gzip={compressed})")
+    return response
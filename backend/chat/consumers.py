@@ -1,39 +1,345 @@
+import asyncio
 import json
 import logging
+import time
+
+import msgpack
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 
+from core import metrics, throttling
+
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+metrics.describe("neora_ws_send_queue_depth", "Events waiting in this process's websocket outbound queues")
+metrics.describe("neora_ws_send_queue_merged_total", "Deltas merged into an already queued delta")
+metrics.describe("neora_ws_send_queue_dropped_total", "Heartbeats shed from full outbound queues")
+metrics.describe("neora_ws_send_queue_peak_total", "Closed websockets by the deepest their outbound queue got (cumulative le buckets)")
+
+# Events queued across every socket's SendQueue in this process; exported
+# as one gauge rather than a series per connection
+_queued_events = 0
+
+# Upper bounds for the per-connection peak depth buckets
+QUEUE_PEAK_BUCKETS = (1, 4, 16, 64)
+
+
+def _adjust_queue_depth(change):
+    global _queued_events
+    if change:
+        _queued_events += change
+        metrics.set_gauge("neora_ws_send_queue_depth", _queued_events)
+
+
+def _observe_queue_peak(peak):
+    """Count a closed socket's peak queue depth into histogram-style buckets."""
+    for bound in QUEUE_PEAK_BUCKETS:
+        if peak <= bound:
+            metrics.incr("neora_ws_send_queue_peak_total", le=str(bound))
+    metrics.incr("neora_ws_send_queue_peak_total", le="+Inf")
+
+
+# Strong references to turns still waiting on the assistant; a turn keeps
+# running (and stays resumable) after the socket that started it closes.
+_pending_turns = set()
+
+
+class ChatTurnMixin:
+    """
+    Run chat turns sent as frames on the socket, without an HTTP round trip.
+
+    A {"type": "chat_message", "text": "...", "language": "en",
+    "client_id": "..."} frame persists the turn and is answered with an
+    "ack" carrying both server messages; the reply then streams back as
+    the usual delta/done events.
+    """
+
+    async def handle_chat_message(self, content):
+        from .serializers import MessageCreateSerializer, MessageSerializer
+        from .services.pipeline import complete_turn, start_turn
+
+        user = self.scope.get("user")
+        client_id = content.get("client_id")
+
+        if not (user and user.is_authenticated):
+            await self.send_json({
+                "type": "error",
+                "code": "not_authenticated",
+                "message": "Authentication required to send messages",
+                "client_id": client_id
+            })
+            return
+
+        # Same bucket as POST /api/messages/, so switching transports gains nothing
+        allowed, wait = await throttling.atake("messages", f"user:{user.pk}")
+        if not allowed:
+            await self.send_json({
+                "type": "error",
+                "code": "throttled",
+                "message": "Too many messages. Please slow down.",
+                "retry_after": wait,
+                "client_id": client_id
+            })
+            return
+
+        serializer = MessageCreateSerializer(data={
+            "text": content.get("text", ""),
+            "language": content.get("language") or "en",
+        })
+        if not serializer.is_valid():
+            await self.send_json({
+                "type": "error",
+                "code": "invalid_message",
+                "errors": serializer.errors,
+                "client_id": client_id
+            })
+            return
+
+        message_text = serializer.validated_data["text"]
+        language = serializer.validated_data.get("language", "en")
+
+        try:
+            user_message, assistant_message = await start_turn(user, message_text)
+        except Exception as e:
+            logger.error(f"Error creating message over WebSocket: {e}")
+            await self.send_json({
+                "type": "error",
+                "code": "send_failed",
+                "message": "Failed to create message. Please try again.",
+                "client_id": client_id
+            })
+            return
+
+        await self.send_json({
+            "type": "ack",
+            "client_id": client_id,
+            "user_message": MessageSerializer(user_message).data,
+            "assistant_message": MessageSerializer(assistant_message).data
+        })
 
-class StreamConsumer(AsyncJsonWebsocketConsumer):
+        task = asyncio.create_task(complete_turn(user, assistant_message, message_text, language))
+        _pending_turns.add(task)
+        task.add_done_callback(_pending_turns.discard)
+
+
+class ManagedSocketMixin:
+    """
+    Heartbeats, idle reaping and per-user socket caps.
+
+    Consumers call start_session() once accepted and end_session() on
+    disconnect, and join groups through join_group(). The server sends a
+    heartbeat every WS_HEARTBEAT_INTERVAL seconds, which clients answer with
+    a "pong"; a socket that has sent no frame for WS_IDLE_TIMEOUT seconds
+    leaves its groups and is closed with 4408. Opening more than WS_MAX_CONNECTIONS_PER_USER sockets closes the
+    user's oldest one with 4409, and anonymous sockets are closed with 4001
+    after WS_ANONYMOUS_TIMEOUT seconds.
+
+    Stream events, heartbeats and pongs go through a bounded SendQueue
+    drained by a writer task, so a slow client never stalls consumption from
+    the layer and is the first to lose its heartbeats. Joining the
+    user's group also registers the socket for in-process delivery (see
+    chat/services/local_delivery.py).
+    """
+
+    CLOSE_UNAUTHENTICATED = 4001
+    CLOSE_IDLE = 4408
+    CLOSE_EVICTED = 4409
+
+    joined_groups = frozenset()
+    outbox = None
+    _session_task = None
+    _writer_task = None
+    _registered = False
+    _ended = False
+    _local_token = None
+
+    def allow_anonymous(self):
+        return settings.WS_ANONYMOUS_TIMEOUT > 0
+
+    async def join_group(self, group):
+        from .services.local_delivery import local_registry
+        from .services.streaming import user_group
+
+        user = self.scope.get("user")
+        if self._local_token is None and user and user.is_authenticated and group == user_group(user.id):
+            # Before group_add: channel-layer copies of local events are
+            # skipped, so the socket must already be reachable in memory
+            self._local_token = local_registry.register(user.id, self._enqueue)
+        await self.channel_layer.group_add(group, self.channel_name)
+        self.joined_groups = self.joined_groups | {group}
+
+    async def leave_groups(self):
+        groups, self.joined_groups = self.joined_groups, frozenset()
+        for group in groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def websocket_receive(self, message):
+        self.last_seen = time.monotonic()
+        await super().websocket_receive(message)
+
+    async def start_session(self):
+        from .services.connections import get_connection_registry
+
+        self.connected_at = self.last_seen = time.monotonic()
+        user = self.scope.get("user")
+
+        if user and user.is_authenticated:
+            limit = max(settings.WS_MAX_CONNECTIONS_PER_USER, 1)
+            try:
+                evicted = await get_connection_registry().register(user.id, self.channel_name, limit)
+                self._registered = True
+            except Exception as e:
+                # The cap is best effort; an unavailable registry must not block sockets
+                logger.warning(f"Failed to register WebSocket for user {user.id}, not enforcing the cap: {e}")
+                evicted = []
+            for channel_name in evicted:
+                logger.info(f"Evicting oldest WebSocket of user {user.id}: {channel_name}")
+                await self.channel_layer.send(channel_name, {"type": "connection.evict"})
+
+        self._session_task = asyncio.create_task(self._session_loop())
+
+    async def end_session(self):
+        from .services.connections import get_connection_registry
+        from .services.local_delivery import local_registry
+
+        self._ended = True
+        if self._local_token is not None:
+            local_registry.unregister(self.scope["user"].id, self._local_token)
+            self._local_token = None
+        for task in (self._session_task, self._writer_task):
+            if task is not None and task is not asyncio.current_task():
+                task.cancel()
+        self._session_task = self._writer_task = None
+        if self.outbox is not None:
+            _adjust_queue_depth(-len(self.outbox))
+            _observe_queue_peak(self.outbox.high_water)
+            self.outbox = None
+
+        await self.leave_groups()
+        if self._registered:
+            self._registered = False
+            user = self.scope.get("user")
+            try:
+                await get_connection_registry().unregister(user.id, self.channel_name)
+            except Exception as e:
+                logger.warning(f"Failed to unregister WebSocket for user {user.id}: {e}")
+
+    async def reap(self, code):
+        """Drop group membership now, then close; a dead peer may never ack the close."""
+        await self.end_session()
+        await self.close(code)
+
+    async def _session_loop(self):
+        from .services.connections import get_connection_registry
+
+        user = self.scope.get("user")
+        authenticated = bool(user and user.is_authenticated)
+        deadline = None if authenticated else self.connected_at + settings.WS_ANONYMOUS_TIMEOUT
+
+        while True:
+            delay = settings.WS_HEARTBEAT_INTERVAL
+            if deadline is not None:
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+            await asyncio.sleep(delay)
+
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                logger.info("Closing time-boxed anonymous WebSocket")
+                await self.reap(self.CLOSE_UNAUTHENTICATED)
+                return
+            if now - self.last_seen >= settings.WS_IDLE_TIMEOUT:
+                logger.info(f"Reaping idle WebSocket {self.channel_name} after {now - self.last_seen:.0f}s")
+                await self.reap(self.CLOSE_IDLE)
+                return
+
+            # Queued behind stream events, so a backed-up socket sheds it
+            self._enqueue({"type": "heartbeat", "timestamp": int(time.time() * 1000)})
+            if self._registered:
+                try:
+                    await get_connection_registry().touch(user.id)
+                except Exception as e:
+                    logger.warning(f"Failed to refresh WebSocket registry for user {user.id}: {e}")
+
+    async def stream_message(self, event):
+        """Queue a stream event from the channel layer for this socket."""
+        from .services.local_delivery import is_local_echo
+
+        if not is_local_echo(event):
+            self._enqueue(event["message"])
+
+    def _enqueue(self, message):
+        """Queue an outbound event; also the in-process delivery callback."""
+        from .services.send_queue import SendQueue
+
+        if self._ended:
+            return
+        if self.outbox is None:
+            self.outbox = SendQueue(settings.WS_SEND_QUEUE_SIZE)
+            self._writer_task = asyncio.create_task(self._drain_outbox())
+
+        depth, merged, dropped = len(self.outbox), self.outbox.merged, self.outbox.dropped
+        self.outbox.put(message)
+        if self.outbox.merged > merged:
+            metrics.incr("neora_ws_send_queue_merged_total", self.outbox.merged - merged)
+        if self.outbox.dropped > dropped:
+            metrics.incr("neora_ws_send_queue_dropped_total", self.outbox.dropped - dropped)
+        _adjust_queue_depth(len(self.outbox) - depth)
+
+    async def _drain_outbox(self):
+        outbox = self.outbox
+        while True:
+            message = await outbox.get()
+            _adjust_queue_depth(-1)
+            await self.send_json(message)
+            logger.debug(f"Streamed message to client: {message.get('type')}")
+
+    async def connection_evict(self, event):
+        """Closes this socket when the user opened one too many."""
+        await self.send_json({
+            "type": "evicted",
+            "message": "Connection closed because a newer one was opened"
+        })
+        await self.reap(self.CLOSE_EVICTED)
+
+
+class StreamConsumer(ManagedSocketMixin, ChatTurnMixin, AsyncJsonWebsocketConsumer):
     """
     WebSocket consumer for streaming assistant responses to authenticated users.
+
+    Speaks JSON by default; clients can negotiate the compact MessagePack
+    framing in chat/services/framing.py via the WebSocket subprotocol.
     """
-    
+
+    codec = None
+
     async def connect(self):
         """Handle WebSocket connection."""
+        from .services.framing import negotiate
+
         user = self.scope.get("user")
         
         # Debug logging
         logger.info(f"WebSocket connection attempt - user: {user}, authenticated: {user.is_authenticated if user else False}")
-        logger.info(f"WebSocket scope headers: {dict(self.scope.get('headers', []))}")
-        logger.info(f"WebSocket query string: {self.scope.get('query_string', b'').decode('utf-8')}")
         
-        # For now, accept all connections to avoid blocking the app
-        # TODO: Implement proper JWT authentication for WebSocket
-        await self.accept()
+        authenticated = bool(user and user.is_authenticated)
+        if not authenticated and not self.allow_anonymous():
+            await self.close(code=self.CLOSE_UNAUTHENTICATED)
+            return
+
+        self.codec, subprotocol = negotiate(self.scope.get("subprotocols"))
+
+        # Anonymous sockets are accepted (so the app is not blocked before
+        # login) but time-boxed; see ManagedSocketMixin.
+        await self.accept(subprotocol)
         
-        if user and user.is_authenticated:
+        if authenticated:
             # Join user-specific group
             self.user_group = f"user_{user.id}"
-            await self.channel_layer.group_add(
-                self.user_group,
-                self.channel_name
-            )
+            await self.join_group(self.user_group)
             
             logger.info(f"WebSocket connected for user {user.email}")
             
@@ -51,19 +357,50 @@ class StreamConsumer(AsyncJsonWebsocketConsumer):
                 "status": "connected",
                 "message": "WebSocket connection established (anonymous)"
             })
+
+        await self.start_session()
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
         user = self.scope.get("user")
+
+        await self.end_session()
         
         if user and user.is_authenticated:
-            # Leave user-specific group
-            await self.channel_layer.group_discard(
-                self.user_group,
-                self.channel_name
-            )
-            
             logger.info(f"WebSocket disconnected for user {user.email}, close_code: {close_code}")
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        # A malformed frame is answered with an error instead of closing the socket
+        try:
+            if bytes_data is not None and self.codec is not None and self.codec.binary:
+                content = self.codec.decode(bytes_data)
+            elif text_data:
+                content = await self.decode_json(text_data)
+            else:
+                raise ValueError("expected a text frame")
+            if not isinstance(content, dict):
+                raise ValueError("frames must be objects")
+        except (ValueError, msgpack.UnpackException) as e:
+            await self.send_json({
+                "type": "error",
+                "code": "invalid_frame",
+                "message": f"Could not decode frame: {e}"
+            })
+            return
+        await self.receive_json(content, **kwargs)
+
+    async def send_json(self, content, close=False):
+        """Send an event in the negotiated wire format."""
+        if self.codec is None:
+            await super().send_json(content, close=close)
+            return
+        for frame in self.codec.encode(content):
+            if self.codec.binary:
+                await self.send(bytes_data=frame)
+            else:
+                await self.send(text_data=frame)
+        if close:
+            await self.close(close)
     
     async def receive_json(self, content):
         """
@@ -74,11 +411,11 @@ class StreamConsumer(AsyncJsonWebsocketConsumer):
         user = self.scope.get("user")
         message_type = content.get("type")
         
-        logger.debug(f"Received WebSocket message from {user.email}: {message_type}")
+        logger.debug(f"Received WebSocket message from {getattr(user, 'email', 'anonymous')}: {message_type}")
         
         # Handle different message types
         if message_type == "ping":
-            await self.send_json({
+            self._enqueue({
                 "type": "pong",
                 "timestamp": content.get("timestamp")
             })
@@ -89,7 +426,17 @@ class StreamConsumer(AsyncJsonWebsocketConsumer):
                 "type": "subscribed",
                 "message": "Subscribed to assistant responses"
             })
-        
+
+        elif message_type in ("heartbeat", "pong"):
+            # Heartbeat replies only need to reset the idle timer
+            pass
+
+        elif message_type == "resume":
+            await self.resume_stream(content)
+
+        elif message_type == "chat_message":
+            await self.handle_chat_message(content)
+
         else:
             # Unknown message type
             await self.send_json({
@@ -97,18 +444,53 @@ class StreamConsumer(AsyncJsonWebsocketConsumer):
                 "message": f"Unknown message type: {message_type}"
             })
     
-    async def stream_message(self, event):
+    async def resume_stream(self, content):
         """
-        Handle streaming messages from the channel layer.
-        This is called when the backend sends streaming data.
+        Replay the deltas of an assistant message the client missed.
+
+        Expects {"type": "resume", "message_id": "...", "last_seq": n} and
+        answers with the logged events after seq n, then a "resumed" marker.
+        Live events keep arriving meanwhile, so the client should drop any
+        event whose seq it has already applied.
         """
-        message = event["message"]
-        
-        # Forward the message to the WebSocket client
-        await self.send_json(message)
-        
-        logger.debug(f"Streamed message to client: {message.get('type')}")
-    
+        from .services.streaming import replay_events
+
+        user = self.scope.get("user")
+        message_id = str(content.get("message_id") or "")
+        if not (user and user.is_authenticated) or not message_id:
+            await self.send_json({
+                "type": "error",
+                "code": "resume_invalid",
+                "message": "Resume requires authentication and a message_id"
+            })
+            return
+
+        try:
+            last_seq = int(content.get("last_seq") or 0)
+        except (TypeError, ValueError):
+            last_seq = 0
+
+        events = await replay_events(user.id, message_id, last_seq)
+        if events is None:
+            # Log expired or never existed; the client should refetch history
+            await self.send_json({
+                "type": "error",
+                "code": "resume_unavailable",
+                "message": "Stream is no longer available",
+                "message_id": message_id
+            })
+            return
+
+        for event in events:
+            await self.send_json(event)
+
+        await self.send_json({
+            "type": "resumed",
+            "message_id": message_id,
+            "replayed": len(events)
+        })
+        logger.debug(f"Replayed {len(events)} events for message {message_id}")
+
     async def message_update(self, event):
         """
         Handle message updates from the channel layer.
@@ -125,10 +507,10 @@ class StreamConsumer(AsyncJsonWebsocketConsumer):
         logger.debug(f"Sent message update to client: {message.get('id')}")
 
 
-class ChatConsumer(AsyncJsonWebsocketConsumer):
+class ChatConsumer(ManagedSocketMixin, ChatTurnMixin, AsyncJsonWebsocketConsumer):
     """
-    Alternative WebSocket consumer for real-time chat functionality.
-    This could be used for more interactive features in the future.
+    WebSocket consumer for full-duplex chat: turns are sent as frames and
+    the assistant reply streams back on the same connection.
     """
     
     async def connect(self):
@@ -140,47 +522,35 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             self.room_name = f"chat_{user.id}"
             self.room_group_name = f"chat_group_{user.id}"
             
-            await self.channel_layer.group_add(
-                self.room_group_name,
-                self.channel_name
-            )
+            await self.join_group(self.room_group_name)
+            # Assistant replies are streamed to the user group
+            self.user_group = f"user_{user.id}"
+            await self.join_group(self.user_group)
             
             await self.accept()
+            await self.start_session()
             
             logger.info(f"Chat WebSocket connected for user {user.email}")
             
         else:
-            await self.close(code=4001)
+            await self.close(code=self.CLOSE_UNAUTHENTICATED)
     
     async def disconnect(self, close_code):
         """Handle WebSocket disconnection."""
         user = self.scope.get("user")
         
+        await self.end_session()
+        
         if user and user.is_authenticated:
-            await self.channel_layer.group_discard(
-                self.room_group_name,
-                self.channel_name
-            )
-            
             logger.info(f"Chat WebSocket disconnected for user {user.email}")
     
     async def receive_json(self, content):
         """Handle incoming chat messages."""
-        user = self.scope.get("user")
         message_type = content.get("type")
         
         if message_type == "chat_message":
-            # Handle real-time chat messages
-            message_text = content.get("message", "")
-            
-            # Echo the message back (or process it)
-            await self.send_json({
-                "type": "chat_message",
-                "message": message_text,
-                "user": user.email,
-                "timestamp": content.get("timestamp")
-            })
-    
+            await self.handle_chat_message(content)
+
     async def chat_message(self, event):
         """Send chat message to WebSocket."""
         await self.send_json(event["message"])
@@ -0,0 +1,66 @@
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.models import MessageImport
+from chat.services.importer import import_messages
+
+
+class Command(BaseCommand):
+    help = "Bulk import an NDJSON message history into a user's account."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the NDJSON file")
+        parser.add_argument("--user", help="Email of the account to import into")
+        parser.add_argument("--batch-size", type=int, default=settings.CHAT_IMPORT_BATCH_SIZE)
+        parser.add_argument("--resume", help="ID of a failed import to resume from its last committed batch")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+
+        if options["resume"]:
+            try:
+                job = MessageImport.objects.get(id=options["resume"])
+            except (MessageImport.DoesNotExist, ValueError):
+                raise CommandError(f"Import {options['resume']} not found")
+            job.status = "running"
+            job.save(update_fields=["status", "updated_at"])
+            self.stdout.write(f"Resuming import {job.id} after line {job.lines_committed}")
+        else:
+            if not options["user"]:
+                raise CommandError("--user is required for a new import")
+            User = get_user_model()
+            try:
+                user = User.objects.get(email=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+            job = MessageImport.objects.create(
+                user=user,
+                source=os.path.basename(path),
+                batch_size=options["batch_size"]
+            )
+            self.stdout.write(f"Started import {job.id}")
+
+        def on_batch(stats):
+            self.stdout.write(
+                f"batch {stats['batch']}: {stats['rows']} rows, {stats['rejected']} rejected, "
+                f"{stats['seconds']}s ({stats['rows_per_second']} rows/s)"
+            )
+
+        try:
+            with open(path, "rb") as fh:
+                report = import_messages(job, fh, on_batch=on_batch)
+        except Exception as e:
+            raise CommandError(f"Import failed: {e}. Resume with --resume {job.id}")
+
+        for error in report["errors"]:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['rows_committed']} messages "
+            f"({report['rows_rejected']} rejected) in {report['batches_committed']} batches"
+        ))
@@ -0,0 +1,345 @@
+import asyncio
+import gc
+import json
+import os
+import resource
+import time
+import tracemalloc
+from contextlib import ExitStack
+from unittest import mock
+
+import redis
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from audit.buffer import audit_buffer
+from chat.services import pipeline, streaming
+from core import metrics
+
+User = get_user_model()
+
+LOADTEST_DOMAIN = "loadtest.neora.invalid"
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do".split()
+
+SERVER_COUNTERS = {
+    "merged": "neora_ws_send_queue_merged_total",
+    "shed": "neora_ws_send_queue_dropped_total",
+    "published": "neora_stream_events_published_total",
+    "local": "neora_stream_events_local_total",
+}
+
+
+def mock_reply(message, words):
+    """Reply the mock n8n workflow gives for `message` (clients check it verbatim)."""
+    return " ".join([f"re:{message}"] + [FILLER[i % len(FILLER)] for i in range(max(words - 1, 0))])
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def counter_values():
+    counters = metrics.snapshot()["counters"]
+    return {key: counters.get(name, 0) for key, name in SERVER_COUNTERS.items()}
+
+
+class RemotePublisher:
+    """Stands in for the local registry so every event takes the channel layer."""
+
+    def deliver(self, user_id, message):
+        return 0
+
+
+class LoadRun:
+    """One load run against the in-process websocket stack."""
+
+    def __init__(self, application, tokens, options):
+        self.application = application
+        self.tokens = tokens
+        self.options = options
+        self.sent_at = {}
+        self.delta_latencies = []
+        self.turn_latencies = []
+        self.stats = {
+            "connected": 0,
+            "connect_failed": 0,
+            "turns_ok": 0,
+            "turns_lost": 0,
+            "turns_corrupt": 0,
+            "deltas_sent": 0,
+            "deltas_received": 0,
+        }
+
+    async def timed_send_event(self, user_id, message, _send_event=streaming.send_event):
+        if message.get("type") == "delta":
+            self.stats["deltas_sent"] += 1
+        self.sent_at[(message["message_id"], message["seq"])] = time.perf_counter()
+        await _send_event(user_id, message)
+
+    async def mock_workflow(self, user_id, message, locale, **kwargs):
+        await asyncio.sleep(self.options["n8n_latency"])
+        return mock_reply(message, self.options["reply_words"])
+
+    async def connect(self, index):
+        token = self.tokens[index % len(self.tokens)]
+        communicator = WebsocketCommunicator(
+            self.application, "/ws/stream/",
+            headers=[(b"cookie", f"access_token={token}".encode())],
+        )
+        try:
+            connected, _ = await communicator.connect(timeout=self.options["timeout"])
+            if connected:
+                await communicator.receive_json_from(timeout=self.options["timeout"])
+        except Exception:
+            connected = False
+        if not connected:
+            self.stats["connect_failed"] += 1
+            return None
+        self.stats["connected"] += 1
+        return communicator
+
+    async def receive(self, communicator):
+        """Next stream event, answering heartbeats on the way."""
+        while True:
+            event = await communicator.receive_json_from(timeout=self.options["timeout"])
+            if event.get("type") == "heartbeat":
+                await communicator.send_json_to({"type": "pong"})
+                continue
+            return event
+
+    async def run_turn(self, communicator, index, turn):
+        client_id = f"{index}-{turn}"
+        text = f"load-{client_id}"
+        started = time.perf_counter()
+        await communicator.send_json_to({"type": "chat_message", "text": text, "client_id": client_id})
+
+        message_id = None
+        received = []
+        while True:
+            event = await self.receive(communicator)
+            now = time.perf_counter()
+            event_type = event.get("type")
+            if event_type == "ack" and event.get("client_id") == client_id:
+                message_id = event["assistant_message"]["id"]
+                continue
+            sent = self.sent_at.pop((event.get("message_id"), event.get("seq")), None)
+            if event.get("message_id") != message_id:
+                continue
+            if sent is not None:
+                self.delta_latencies.append(now - sent)
+            if event_type == "delta":
+                self.stats["deltas_received"] += 1
+                received.append(event["data"])
+            elif event_type == "done":
+                break
+            elif event_type == "error":
+                self.stats["turns_lost"] += 1
+                return
+
+        self.turn_latencies.append(time.perf_counter() - started)
+        if "".join(received) == mock_reply(text, self.options["reply_words"]):
+            self.stats["turns_ok"] += 1
+        else:
+            self.stats["turns_corrupt"] += 1
+
+    async def drive(self, communicator, index, start):
+        await start.wait()
+        for turn in range(self.options["turns"]):
+            try:
+                await self.run_turn(communicator, index, turn)
+            except Exception:
+                # Receive timed out (the communicator cancels the app) or the socket closed
+                self.stats["turns_lost"] += self.options["turns"] - turn
+                return False
+            if self.options["think_time"]:
+                await asyncio.sleep(self.options["think_time"])
+        return True
+
+    async def run(self):
+        connections = self.options["connections"]
+
+        gc.collect()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        connect_started = time.perf_counter()
+        communicators = []
+        ramp = self.options["ramp"]
+        for batch_start in range(0, connections, ramp or connections):
+            batch = range(batch_start, min(batch_start + (ramp or connections), connections))
+            communicators += await asyncio.gather(*(self.connect(index) for index in batch))
+            if ramp and batch_start + ramp < connections:
+                await asyncio.sleep(1)
+        connect_seconds = time.perf_counter() - connect_started
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+
+        before = counter_values()
+        start = asyncio.Event()
+        drivers = [
+            asyncio.create_task(self.drive(communicator, index, start))
+            for index, communicator in enumerate(communicators)
+            if communicator is not None
+        ]
+        turns_started = time.perf_counter()
+        start.set()
+        alive = await asyncio.gather(*drivers)
+        turn_seconds = time.perf_counter() - turns_started
+        after = counter_values()
+
+        open_communicators = [c for c in communicators if c is not None]
+        for communicator, ok in zip(open_communicators, alive):
+            if ok:
+                try:
+                    await communicator.disconnect()
+                except Exception:
+                    pass
+
+        connected = self.stats["connected"]
+        report = dict(self.stats)
+        report.update({
+            "connect_seconds": round(connect_seconds, 3),
+            "handshakes_per_second": round(connected / connect_seconds, 1) if connect_seconds else None,
+            "memory_per_connection_kib": round(held / connected / 1024, 1) if connected else None,
+            "turn_seconds": round(turn_seconds, 3),
+            "deltas_per_second": round(self.stats["deltas_received"] / turn_seconds, 1) if turn_seconds else None,
+            "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+        for key in SERVER_COUNTERS:
+            report[f"server_{key}"] = int(after[key] - before[key])
+        for label, values in (("delta_latency", self.delta_latencies), ("turn_latency", self.turn_latencies)):
+            for pct in (50, 95, 99, 100):
+                value = percentile(values, pct)
+                name = "max" if pct == 100 else f"p{pct}"
+                report[f"{label}_{name}_ms"] = round(value * 1000, 2) if value is not None else None
+        return report
+
+
+class Command(BaseCommand):
+    help = (
+        "Open N authenticated connections to ws/stream/ in-process, drive chat turns against a "
+        "mock n8n workflow and report per-delta latency, lost events and memory per connection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=100)
+        parser.add_argument("--connections-per-user", type=int, default=1,
+                            help="Sockets sharing one user (and its user group)")
+        parser.add_argument("--turns", type=int, default=1, help="Chat turns per connection")
+        parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between a connection's turns")
+        parser.add_argument("--reply-words", type=int, default=200, help="Words in each mock n8n reply")
+        parser.add_argument("--n8n-latency", type=float, default=0.2, help="Seconds the mock n8n takes per turn")
+        parser.add_argument("--ramp", type=int, default=0,
+                            help="Connections opened per second (default: all at once)")
+        parser.add_argument("--timeout", type=float, default=30.0, help="Seconds to wait for any one frame")
+        parser.add_argument("--layer", choices=["memory", "redis"], action="append",
+                            help="Channel layer to run against; repeat to compare (default: memory)")
+        parser.add_argument("--redis-url", default=os.getenv("LOADTEST_REDIS_URL", "redis://localhost:6379/0"),
+                            help="Redis used by --layer redis")
+        parser.add_argument("--publish", choices=["layer", "local"], default="layer",
+                            help="layer: events cross the channel layer as if published by another "
+                                 "process; local: use the in-process fast path")
+        parser.add_argument("--json", dest="json_path", help="Also write the report to this file")
+        parser.add_argument("--keep-users", action="store_true", help="Keep the generated load-test users")
+
+    def handle(self, *args, **options):
+        if options["connections"] < 1 or options["turns"] < 1:
+            raise CommandError("--connections and --turns must be at least 1")
+        if options["connections_per_user"] > settings.WS_MAX_CONNECTIONS_PER_USER:
+            raise CommandError(
+                f"--connections-per-user exceeds WS_MAX_CONNECTIONS_PER_USER "
+                f"({settings.WS_MAX_CONNECTIONS_PER_USER}); extra sockets would be evicted"
+            )
+
+        from neora.asgi import application
+
+        # Skip AdmissionControlMiddleware: the ramp is ours to control and a
+        # deferred handshake would only show up as a failed connect
+        websocket_app = application.application_mapping["websocket"].inner
+
+        user_count = -(-options["connections"] // options["connections_per_user"])
+        users = self.create_users(user_count)
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+
+        layers = options["layer"] or ["memory"]
+        reports = {}
+        try:
+            for layer in layers:
+                self.stdout.write(f"Running {options['connections']} connections against the {layer} channel layer...")
+                reports[layer] = self.run_layer(layer, websocket_app, tokens, options)
+        finally:
+            if not options["keep_users"]:
+                # Buffered audit events point at these users; write them first
+                # so the delete nulls their user instead of the flush failing
+                audit_buffer.flush()
+                User.objects.filter(email__endswith=f"@{LOADTEST_DOMAIN}").delete()
+
+        self.write_report(reports)
+        if options["json_path"]:
+            config = {key: options[key] for key in (
+                "connections", "connections_per_user", "turns", "think_time", "reply_words",
+                "n8n_latency", "ramp", "publish",
+            )}
+            with open(options["json_path"], "w", encoding="utf-8") as fh:
+                json.dump({"config": config, "runs": reports}, fh, indent=2)
+            self.stdout.write(f"Report written to {options['json_path']}")
+
+    def create_users(self, count):
+        emails = [f"user{index}@{LOADTEST_DOMAIN}" for index in range(count)]
+        existing = set(User.objects.filter(email__in=emails).values_list("email", flat=True))
+        new_users = []
+        for email in emails:
+            if email not in existing:
+                user = User(email=email, is_email_verified=True)
+                user.set_unusable_password()
+                new_users.append(user)
+        User.objects.bulk_create(new_users, batch_size=500)
+        by_email = {user.email: user for user in User.objects.filter(email__in=emails)}
+        return [by_email[email] for email in emails]
+
+    def run_layer(self, layer, websocket_app, tokens, options):
+        if layer == "redis":
+            try:
+                redis.from_url(options["redis_url"]).ping()
+            except redis.RedisError as e:
+                raise CommandError(f"Could not reach {options['redis_url']}: {e}")
+            channel_layers = {"default": {
+                "BACKEND": "neora.channel_layers.ShardedRedisChannelLayer",
+                "CONFIG": {"hosts": [options["redis_url"]]},
+            }}
+            redis_url = options["redis_url"]
+        else:
+            channel_layers = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+            # The connection registry, delta log and throttles follow REDIS_URL;
+            # keep them in process too so the run measures no Redis at all
+            redis_url = "memory://"
+
+        run = LoadRun(websocket_app, tokens, options)
+        with ExitStack() as stack:
+            stack.enter_context(override_settings(
+                CHANNEL_LAYERS=channel_layers, REDIS_URL=redis_url, WS_SINGLE_PROCESS=False
+            ))
+            stack.enter_context(mock.patch.object(pipeline, "apost_to_workflow", run.mock_workflow))
+            stack.enter_context(mock.patch.object(streaming, "send_event", run.timed_send_event))
+            if options["publish"] == "layer":
+                stack.enter_context(mock.patch.object(streaming, "local_registry", RemotePublisher()))
+                stack.enter_context(mock.patch.object(streaming, "PROCESS_ID", "loadtest-remote"))
+            return asyncio.run(run.run())
+
+    def write_report(self, reports):
+        layers = list(reports)
+        self.stdout.write("")
+        self.stdout.write(f"{'metric':<30}" + "".join(f"{layer:>14}" for layer in layers))
+        for key in reports[layers[0]]:
+            values = []
+            for layer in layers:
+                value = reports[layer][key]
+                values.append(f"{'-' if value is None else value:>14}")
+            self.stdout.write(f"{key:<30}" + "".join(values))
@@ -0,0 +1,124 @@
+import json
+import uuid
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.services.framing import JSONCodec, MsgpackCodec
+from chat.services.n8n_client import simulate_streaming_response
+from chat.services.streaming import build_event
+
+SAMPLES = {
+    "arabic": (
+        "مرحباً! يسعدني مساعدتك اليوم. بناءً على ما ذكرته، أقترح أن نبدأ بتحديد أولوياتك لهذا الأسبوع، "
+        "ثم نوزع المهام على الأيام بحيث يبقى لديك وقت كافٍ للراحة. إذا أردت، يمكنني إعداد جدول مفصل "
+        "يتضمن مواعيد الاجتماعات والتذكيرات المهمة، مع ملاحظات قصيرة لكل مهمة حتى يسهل عليك متابعتها. "
+        "أخبرني أيضاً إن كانت هناك مواعيد نهائية قريبة حتى نضعها في المقدمة."
+    ),
+    "english": (
+        "Hello! I'm happy to help today. Based on what you mentioned, I suggest we start by setting your "
+        "priorities for this week, then spread the tasks across the days so you still have enough time to "
+        "rest. If you like, I can prepare a detailed schedule with meeting times and important reminders, "
+        "plus a short note for each task so it is easy to follow. Also let me know about any deadlines "
+        "coming up soon so we can put them first."
+    ),
+}
+
+
+class LegacyJSONCodec(JSONCodec):
+    """Channels' default send_json encoding (ASCII-escaped), for comparison."""
+
+    def encode(self, event):
+        return [json.dumps(event)]
+
+
+def frame_header_size(length):
+    """Size of an unmasked server-to-client WebSocket frame header."""
+    if length < 126:
+        return 2
+    if length < 65536:
+        return 4
+    return 10
+
+
+def reply_frames(codec, text, message_id):
+    """Encode one streamed reply (deltas + done) the way StreamConsumer sends it."""
+    events = [
+        build_event(message_id, seq, 'delta', chunk)
+        for seq, chunk in enumerate(simulate_streaming_response(text), start=1)
+    ]
+    events.append(build_event(message_id, len(events) + 1, 'done'))
+
+    frames = []
+    for event in events:
+        for frame in codec.encode(event):
+            frames.append(frame if isinstance(frame, bytes) else frame.encode("utf-8"))
+    return events, frames
+
+
+def measure(frames):
+    payload = sum(len(frame) for frame in frames)
+    headers = sum(frame_header_size(len(frame)) for frame in frames)
+
+    # permessage-deflate (RFC 7692) with context takeover: one raw deflate
+    # stream per connection, sync-flushed per message, minus the 4-byte tail.
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    deflated = []
+    for frame in frames:
+        data = compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        deflated.append(len(data) - 4)
+    deflated_total = sum(deflated) + sum(frame_header_size(size) for size in deflated)
+
+    return {
+        "frames": len(frames),
+        "payload": payload,
+        "headers": headers,
+        "wire": payload + headers,
+        "wire_deflate": deflated_total,
+    }
+
+
+class Command(BaseCommand):
+    help = "Report bytes-on-wire per streamed reply for the JSON and MessagePack websocket protocols."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sample", choices=sorted(SAMPLES), action="append",
+                            help="Built-in reply sample (default: all)")
+        parser.add_argument("--file", help="Measure the reply text in this file instead")
+        parser.add_argument("--replies", type=int, default=1,
+                            help="Consecutive replies on one connection (shows handle reuse)")
+
+    def handle(self, *args, **options):
+        if options["file"]:
+            try:
+                with open(options["file"], encoding="utf-8") as fh:
+                    samples = {options["file"]: fh.read()}
+            except OSError as e:
+                raise CommandError(f"Could not read {options['file']}: {e}")
+        else:
+            samples = {name: SAMPLES[name] for name in (options["sample"] or sorted(SAMPLES))}
+
+        for name, text in samples.items():
+            message_ids = [str(uuid.uuid4()) for _ in range(max(options["replies"], 1))]
+            self.stdout.write(
+                f"\n{name}: {len(text)} chars, {len(text.encode('utf-8'))} UTF-8 bytes, "
+                f"{len(message_ids)} repl{'y' if len(message_ids) == 1 else 'ies'}"
+            )
+            self.stdout.write(f"{'protocol':<12}{'events':>8}{'frames':>8}{'payload':>10}"
+                              f"{'headers':>9}{'on-wire':>9}{'deflate':>9}{'per reply':>11}")
+
+            baseline = None
+            for label, codec in (("json-ascii", LegacyJSONCodec()), ("json", JSONCodec()), ("msgpack", MsgpackCodec())):
+                events, frames = [], []
+                for message_id in message_ids:
+                    reply_events, reply = reply_frames(codec, text, message_id)
+                    events += reply_events
+                    frames += reply
+                stats = measure(frames)
+                per_reply = stats["wire"] / len(message_ids)
+                baseline = baseline or per_reply
+                self.stdout.write(
+                    f"{label:<12}{len(events):>8}{stats['frames']:>8}{stats['payload']:>10}"
+                    f"{stats['headers']:>9}{stats['wire']:>9}{stats['wire_deflate']:>9}"
+                    f"{per_reply:>11.0f}  ({per_reply / baseline:.0%} of json-ascii)"
+                )
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:18
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_export'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='MessageImport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('source', models.CharField(blank=True, default='', max_length=255)),
+                ('batch_size', models.PositiveIntegerField(default=1000)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('failed', 'Failed'), ('done', 'Done')], default='running', max_length=16)),
+                ('lines_committed', models.PositiveIntegerField(default=0)),
+                ('batches_committed', models.PositiveIntegerField(default=0)),
+                ('rows_committed', models.PositiveIntegerField(default=0)),
+                ('rows_rejected', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.6 on 2026-10-18 23:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_sync_seq(apps, schema_editor):
+    """Number existing messages per user in creation order."""
+    Message = apps.get_model('chat', 'Message')
+    ChangeSequence = apps.get_model('chat', 'ChangeSequence')
+
+    # order_by() drops Meta.ordering, which would otherwise be added to the
+    # DISTINCT and yield one row per message instead of per user
+    user_ids = Message.objects.values_list('user_id', flat=True).order_by().distinct()
+    for user_id in user_ids.iterator():
+        seq = 0
+        batch = []
+        for message in Message.objects.filter(user_id=user_id).order_by('created_at', 'id').only('id').iterator(chunk_size=2000):
+            seq += 1
+            message.sync_seq = seq
+            batch.append(message)
+            if len(batch) >= 2000:
+                Message.objects.bulk_update(batch, ['sync_seq'])
+                batch = []
+        if batch:
+            Message.objects.bulk_update(batch, ['sync_seq'])
+        ChangeSequence.objects.update_or_create(user_id=user_id, defaults={'value': seq})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_import'),
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='message_change_sequence', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MessageClear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.BigIntegerField()),
+                ('deleted_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['seq'],
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='sync_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'sync_seq'], name='chat_messag_user_id_86b824_idx'),
+        ),
+        migrations.AddField(
+            model_name='messageclear',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_clears', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='messageclear',
+            index=models.Index(fields=['user', 'seq'], name='chat_messag_user_id_7a6c03_idx'),
+        ),
+        migrations.RunPython(backfill_sync_seq, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='messageexport',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
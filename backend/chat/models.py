@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
 
@@ -25,13 +26,162 @@ class Message(models.Model):
     text = models.TextField(max_length=8000)
     audio_url = models.URLField(null=True, blank=True)
     status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="done")
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add so bulk imports can keep the original timestamps
+    created_at = models.DateTimeField(default=timezone.now)
+    # Per-user change sequence, bumped on create and whenever a SYNCED_FIELDS
+    # value changes (see chat.services.sync)
+    sync_seq = models.BigIntegerField(default=0)
+
+    # What sync clients see; saves that change none of these keep their seq
+    SYNCED_FIELDS = ("role", "text", "audio_url", "status", "created_at")
 
     class Meta:
         indexes = [
-            models.Index(fields=["user", "created_at"])
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["user", "sync_seq"])
         ]
         ordering = ["created_at"]
     
     def __str__(self):
         return f"{self.user.email} - {self.role}: {self.text[:50]}..."
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._synced = instance._synced_values()
+        return instance
+
+    def _synced_values(self):
+        deferred = self.get_deferred_fields()
+        return {name: getattr(self, name) for name in self.SYNCED_FIELDS if name not in deferred}
+
+    def _sync_changed(self, update_fields):
+        loaded = getattr(self, "_synced", None)
+        if self._state.adding or loaded is None:
+            return True
+        names = self.SYNCED_FIELDS
+        if update_fields is not None:
+            names = [name for name in update_fields if name in self.SYNCED_FIELDS]
+        return any(name not in loaded or getattr(self, name) != loaded[name] for name in names)
+
+    def save(self, *args, **kwargs):
+        from .services.sync import allocate_seq
+        from neora.db_router import pin_to_primary
+
+        if not self._sync_changed(kwargs.get("update_fields")):
+            super().save(*args, **kwargs)
+            return
+
+        # Allocate and write in one transaction so rows become visible in
+        # sequence order (the counter row stays locked until commit).
+        with transaction.atomic(using=kwargs.get("using")):
+            self.sync_seq = allocate_seq(self.user_id)
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "sync_seq" not in update_fields:
+                kwargs["update_fields"] = [*update_fields, "sync_seq"]
+            super().save(*args, **kwargs)
+        self._synced = self._synced_values()
+        pin_to_primary(self.user_id)
+
+
+class ChangeSequence(models.Model):
+    """Monotonic per-user counter backing incremental message sync."""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="message_change_sequence"
+    )
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.value}"
+
+
+class MessageClear(models.Model):
+    """Tombstone recorded when a user clears their history."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="message_clears"
+    )
+    seq = models.BigIntegerField()
+    deleted_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "seq"])
+        ]
+        ordering = ["seq"]
+
+    def __str__(self):
+        return f"{self.user_id} cleared at {self.seq}"
+
+
+class MessageExport(models.Model):
+    FORMAT_CHOICES = [
+        ("ndjson", "NDJSON"),
+        ("csv", "CSV")
+    ]
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("error", "Error")
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="message_exports"
+    )
+    format = models.CharField(max_length=16, choices=FORMAT_CHOICES, default="ndjson")
+    compressed = models.BooleanField(default=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="queued")
+    file = models.FileField(upload_to="exports/", null=True, blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Refreshed by the worker while the job runs; see recover_stale_exports()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.user.email} - export {self.format} ({self.status})"
+
+
+class MessageImport(models.Model):
+    STATUS_CHOICES = [
+        ("running", "Running"),
+        ("failed", "Failed"),
+        ("done", "Done")
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="message_imports"
+    )
+    source = models.CharField(max_length=255, blank=True, default="")
+    batch_size = models.PositiveIntegerField(default=1000)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default="running")
+    # Input lines consumed by committed batches; a resumed import skips these
+    lines_committed = models.PositiveIntegerField(default=0)
+    batches_committed = models.PositiveIntegerField(default=0)
+    rows_committed = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.user.email} - import {self.source or self.id} ({self.status})"
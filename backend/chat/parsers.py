@@ -0,0 +1,14 @@
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Pass newline-delimited JSON bodies through unparsed.
+
+    The view receives the request stream itself so large imports can be
+    consumed line by line instead of being loaded into memory.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return stream
@@ -1,12 +1,12 @@
 from rest_framework import serializers
-from .models import Message
+from .models import Message, MessageExport
 
 
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = ['id', 'role', 'text', 'audio_url', 'status', 'created_at']
-        read_only_fields = ['id', 'created_at', 'status']
+        fields = ['id', 'role', 'text', 'audio_url', 'status', 'created_at', 'sync_seq']
+        read_only_fields = ['id', 'created_at', 'status', 'sync_seq']
 
 
 class MessageCreateSerializer(serializers.Serializer):
@@ -60,3 +60,22 @@ class VoiceUploadSerializer(serializers.Serializer):
         
         return value
 
+
+
+class MessageExportCreateSerializer(serializers.Serializer):
+    format = serializers.ChoiceField(choices=['ndjson', 'csv'], required=False, default='ndjson')
+    compressed = serializers.BooleanField(required=False, default=False)
+
+
+class MessageExportSerializer(serializers.ModelSerializer):
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = MessageExport
+        fields = ['id', 'format', 'compressed', 'status', 'row_count', 'error', 'created_at', 'completed_at', 'download_url']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'done':
+            return None
+        return f"/api/messages/export/{obj.id}/download/"
@@ -0,0 +1,83 @@
+"""
+Registry of a user's open websockets, used to cap concurrent sockets.
+
+Each socket is recorded by channel name, scored by connect time. When a
+register pushes a user over WS_MAX_CONNECTIONS_PER_USER the oldest sockets
+are dropped from the registry and returned so the caller can tell them to
+close over the channel layer -- which reaches them on any daphne process.
+"""
+import time
+
+from django.conf import settings
+
+from core.redis_client import get_async_redis, redis_enabled
+
+CONNECTIONS_KEY = "ws:conns:{}"
+
+# Add the socket, then pop the oldest entries beyond the cap in one step so
+# concurrent connects cannot both decide to keep the same slot.
+REGISTER_SCRIPT = """
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+local excess = redis.call('ZCARD', KEYS[1]) - tonumber(ARGV[3])
+if excess <= 0 then
+    return {}
+end
+local evicted = redis.call('ZRANGE', KEYS[1], 0, excess - 1)
+redis.call('ZREM', KEYS[1], unpack(evicted))
+return evicted
+"""
+
+
+def _registry_ttl():
+    # Outlives any live socket's heartbeat, so abandoned keys expire
+    return max(settings.WS_IDLE_TIMEOUT * 2, 60)
+
+
+class RedisConnectionRegistry:
+    async def register(self, user_id, channel_name, limit):
+        evicted = await get_async_redis().eval(
+            REGISTER_SCRIPT, 1, CONNECTIONS_KEY.format(user_id),
+            time.time(), channel_name, limit, _registry_ttl()
+        )
+        return [name.decode() if isinstance(name, bytes) else name for name in evicted]
+
+    async def touch(self, user_id):
+        await get_async_redis().expire(CONNECTIONS_KEY.format(user_id), _registry_ttl())
+
+    async def unregister(self, user_id, channel_name):
+        await get_async_redis().zrem(CONNECTIONS_KEY.format(user_id), channel_name)
+
+
+class MemoryConnectionRegistry:
+    """Per-process fallback used when REDIS_URL is not a Redis server."""
+
+    def __init__(self):
+        self._sockets = {}
+
+    async def register(self, user_id, channel_name, limit):
+        sockets = self._sockets.setdefault(user_id, {})
+        sockets[channel_name] = time.time()
+        excess = len(sockets) - limit
+        if excess <= 0:
+            return []
+        evicted = sorted(sockets, key=sockets.get)[:excess]
+        for name in evicted:
+            del sockets[name]
+        return evicted
+
+    async def touch(self, user_id):
+        pass
+
+    async def unregister(self, user_id, channel_name):
+        sockets = self._sockets.get(user_id, {})
+        sockets.pop(channel_name, None)
+        if not sockets:
+            self._sockets.pop(user_id, None)
+
+
+_memory_registry = MemoryConnectionRegistry()
+
+
+def get_connection_registry():
+    return RedisConnectionRegistry() if redis_enabled() else _memory_registry
@@ -0,0 +1,270 @@
+import csv
+import json
+import logging
+import tempfile
+import threading
+import time
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Message, MessageExport
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ("id", "role", "text", "audio_url", "status", "created_at")
+
+# A running job refreshes heartbeat_at this often; jobs whose heartbeat is
+# older than CHAT_EXPORT_STALE_AFTER are assumed dead and restarted
+HEARTBEAT_INTERVAL = 30
+
+# Bytes gathered before the async export yields a chunk to the response
+ASYNC_CHUNK_BYTES = 64 * 1024
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(user_id):
+    """
+    Iterate over a user's messages in chronological order.
+
+    Rows are fetched as tuples through a server-side cursor (on PostgreSQL),
+    so memory stays constant regardless of history size.
+    """
+    return (
+        Message.objects.filter(user_id=user_id)
+        .order_by("created_at")
+        .values_list(*EXPORT_FIELDS)
+        .iterator(chunk_size=settings.CHAT_EXPORT_CHUNK_SIZE)
+    )
+
+
+def _row_values(row):
+    message_id, role, text, audio_url, status, created_at = row
+    return [str(message_id), role, text, audio_url, status, created_at.isoformat()]
+
+
+def ndjson_line(row):
+    return json.dumps(dict(zip(EXPORT_FIELDS, _row_values(row))), ensure_ascii=False) + "\n"
+
+
+def iter_ndjson(rows):
+    """Yield one JSON document per line for each message row."""
+    for row in rows:
+        yield ndjson_line(row)
+
+
+def iter_csv(rows):
+    """Yield CSV lines (header first) for each message row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(_row_values(row))
+
+
+def iter_gzip(chunks):
+    """Compress a stream of byte chunks into a single gzip member."""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(rows, fmt="ndjson", compressed=False):
+    """
+    Build the byte stream for an export.
+
+    Args:
+        rows: Message rows, typically from export_rows()
+        fmt: "ndjson" or "csv"
+        compressed: Whether to gzip the output
+
+    Yields:
+        Encoded chunks ready to be written to a response or file
+    """
+    lines = iter_csv(rows) if fmt == "csv" else iter_ndjson(rows)
+    chunks = (line.encode("utf-8") for line in lines)
+    return iter_gzip(chunks) if compressed else chunks
+
+
+async def aiter_export(user_id, fmt="ndjson", compressed=False):
+    """
+    Async counterpart of iter_export() for a user's messages.
+
+    Rows come from aiterator(), one CHAT_EXPORT_CHUNK_SIZE fetch at a time,
+    and output is yielded in ~64 KiB chunks, so an ASGI server streams the
+    export without ever holding it in memory.
+    """
+    # values() rather than values_list(): Django's values_list iterable runs
+    # its query as soon as aiterator() builds it, i.e. on the event loop
+    rows = (
+        Message.objects.filter(user_id=user_id)
+        .order_by("created_at")
+        .values(*EXPORT_FIELDS)
+        .aiterator(chunk_size=settings.CHAT_EXPORT_CHUNK_SIZE)
+    )
+    compressor = zlib.compressobj(wbits=31) if compressed else None
+    writer = csv.writer(_Echo())
+    pending = []
+    size = 0
+
+    if fmt == "csv":
+        pending.append(writer.writerow(EXPORT_FIELDS).encode("utf-8"))
+
+    async for values in rows:
+        row = [values[field] for field in EXPORT_FIELDS]
+        line = writer.writerow(_row_values(row)) if fmt == "csv" else ndjson_line(row)
+        data = line.encode("utf-8")
+        if compressor is not None:
+            data = compressor.compress(data)
+        pending.append(data)
+        size += len(data)
+        if size >= ASYNC_CHUNK_BYTES:
+            yield b"".join(pending)
+            pending, size = [], 0
+
+    if compressor is not None:
+        pending.append(compressor.flush())
+    if pending:
+        yield b"".join(pending)
+
+
+def export_filename(fmt="ndjson", compressed=False):
+    stamp = timezone.now().strftime("%Y%m%d-%H%M%S")
+    return f"neora-messages-{stamp}.{fmt}" + (".gz" if compressed else "")
+
+
+def run_export_job(export_id):
+    """
+    Write a queued export to storage.
+
+    Intended to run outside the request cycle; the file is spooled to a
+    temporary file first so only one chunk is held in memory at a time.
+    """
+    close_old_connections()
+    try:
+        export = MessageExport.objects.get(id=export_id)
+    except MessageExport.DoesNotExist:
+        logger.warning(f"Export {export_id} no longer exists")
+        return
+
+    export.status = "running"
+    export.heartbeat_at = timezone.now()
+    export.save(update_fields=["status", "heartbeat_at"])
+
+    row_count = 0
+    beat_at = time.monotonic()
+
+    def counted(rows):
+        nonlocal row_count, beat_at
+        for row in rows:
+            row_count += 1
+            if time.monotonic() - beat_at >= HEARTBEAT_INTERVAL:
+                beat_at = time.monotonic()
+                MessageExport.objects.filter(id=export.id).update(heartbeat_at=timezone.now())
+            yield row
+
+    try:
+        with tempfile.TemporaryFile() as tmp:
+            for chunk in iter_export(counted(export_rows(export.user_id)), export.format, export.compressed):
+                tmp.write(chunk)
+            tmp.seek(0)
+            filename = f"{export.user_id}/{export.id}.{export.format}" + (".gz" if export.compressed else "")
+            export.file.save(filename, File(tmp), save=False)
+
+        export.row_count = row_count
+        export.status = "done"
+        export.completed_at = timezone.now()
+        export.save(update_fields=["file", "row_count", "status", "completed_at"])
+        logger.info(f"Export {export.id} finished for user {export.user_id}: {row_count} messages")
+
+    except Exception as e:
+        logger.error(f"Export {export_id} failed: {e}")
+        export.status = "error"
+        export.error = str(e)
+        export.completed_at = timezone.now()
+        export.save(update_fields=["status", "error", "completed_at"])
+
+    finally:
+        connections.close_all()
+
+
+def start_export_job(export):
+    """Run an export job on a background thread."""
+    thread = threading.Thread(
+        target=run_export_job,
+        args=(export.id,),
+        name=f"message-export-{export.id}",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def recover_stale_exports():
+    """
+    Restart queued/running exports whose worker died (e.g. a restart).
+
+    Each stale job is claimed by refreshing its heartbeat with a conditional
+    update, so when several processes look at once only one restarts it.
+
+    Returns:
+        Number of jobs restarted
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CHAT_EXPORT_STALE_AFTER)
+    stale = MessageExport.objects.filter(status__in=["queued", "running"]).filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, created_at__lt=cutoff)
+    )
+    restarted = 0
+    for export in stale:
+        claimed = MessageExport.objects.filter(
+            id=export.id, status=export.status, heartbeat_at=export.heartbeat_at
+        ).update(status="queued", heartbeat_at=timezone.now())
+        if claimed:
+            logger.warning(f"Restarting stale export {export.id} (was {export.status})")
+            start_export_job(export)
+            restarted += 1
+    return restarted
+
+
+_recovery_started = False
+_recovery_lock = threading.Lock()
+
+
+def start_export_recovery():
+    """Check for stale exports now and then periodically, on a daemon thread."""
+    global _recovery_started
+    with _recovery_lock:
+        if _recovery_started:
+            return
+        _recovery_started = True
+
+    def run():
+        while True:
+            close_old_connections()
+            try:
+                recover_stale_exports()
+            except Exception as e:
+                logger.error(f"Export recovery failed: {e}")
+            finally:
+                close_old_connections()
+            time.sleep(settings.CHAT_EXPORT_STALE_AFTER / 2)
+
+    threading.Thread(target=run, name="message-export-recovery", daemon=True).start()
@@ -0,0 +1,98 @@
+"""
+Wire formats for the stream websocket.
+
+JSON text frames stay the default. A client that offers the
+``neora.msgpack.v1`` subprotocol gets MessagePack binary frames instead,
+where stream events are positional arrays and message ids are interned as
+small per-connection integer handles:
+
+    [0, handle, message_id]           bind handle -> message id (sent before first use)
+    [1, handle, seq, data]            delta
+    [2, handle, seq]                  done
+    [3, handle, seq, code, message]   error
+
+Every other event is sent as a MessagePack map with the same keys as its
+JSON form, and clients may send their frames either as JSON text or as
+MessagePack maps.
+"""
+import json
+
+import msgpack
+
+JSON_SUBPROTOCOL = "neora.json.v1"
+MSGPACK_SUBPROTOCOL = "neora.msgpack.v1"
+
+BIND, DELTA, DONE, ERROR = 0, 1, 2, 3
+
+
+class JSONCodec:
+    subprotocol = JSON_SUBPROTOCOL
+    binary = False
+
+    def encode(self, event):
+        # Compact UTF-8: escaping non-ASCII triples the size of Arabic text
+        return [json.dumps(event, ensure_ascii=False, separators=(",", ":"))]
+
+    def decode(self, data):
+        return json.loads(data)
+
+
+class MsgpackCodec:
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    # A socket only ever sees a handful of replies; past this the table is
+    # reset and ids are bound again, so clients must let a bind overwrite.
+    MAX_HANDLES = 1024
+
+    def __init__(self):
+        self._handles = {}
+
+    def _handle(self, message_id, frames):
+        handle = self._handles.get(message_id)
+        if handle is None:
+            if len(self._handles) >= self.MAX_HANDLES:
+                self._handles.clear()
+            handle = len(self._handles)
+            self._handles[message_id] = handle
+            frames.append(msgpack.packb([BIND, handle, message_id]))
+        return handle
+
+    def encode(self, event):
+        frames = []
+        event_type = event.get("type")
+        message_id = event.get("message_id")
+        seq = event.get("seq")
+
+        if message_id and seq is not None and event_type in ("delta", "done", "error"):
+            handle = self._handle(message_id, frames)
+            if event_type == "delta":
+                frames.append(msgpack.packb([DELTA, handle, seq, event.get("data", "")]))
+            elif event_type == "done":
+                frames.append(msgpack.packb([DONE, handle, seq]))
+            else:
+                frames.append(msgpack.packb([ERROR, handle, seq, event.get("code", ""), event.get("message", "")]))
+        else:
+            frames.append(msgpack.packb(event))
+        return frames
+
+    def decode(self, data):
+        content = msgpack.unpackb(data)
+        if not isinstance(content, dict):
+            raise ValueError("MessagePack frames must be maps")
+        return content
+
+
+def negotiate(subprotocols):
+    """
+    Pick a codec from the subprotocols offered by the client.
+
+    Returns:
+        (codec, subprotocol to accept or None)
+    """
+    subprotocols = subprotocols or []
+    if MSGPACK_SUBPROTOCOL in subprotocols:
+        return MsgpackCodec(), MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in subprotocols:
+        return JSONCodec(), JSON_SUBPROTOCOL
+    return JSONCodec(), None
@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from ..models import Message
+from .sync import allocate_seq
+
+logger = logging.getLogger(__name__)
+
+ROLES = {choice for choice, _ in Message.ROLE_CHOICES}
+STATUSES = {choice for choice, _ in Message.STATUS_CHOICES}
+MAX_TEXT_LENGTH = 8000
+
+# Rejected rows are counted in full but only this many are echoed back
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportRowError(ValueError):
+    """Raised when an NDJSON row does not match the import schema."""
+
+
+def validate_row(data):
+    """
+    Validate one imported message.
+
+    Expected shape::
+
+        {"role": "user"|"assistant", "text": "...", "created_at": "<ISO 8601>",
+         "status": "done" (optional), "audio_url": "..." (optional)}
+
+    Returns:
+        dict of Message field values
+
+    Raises:
+        ImportRowError: If the row is invalid
+    """
+    if not isinstance(data, dict):
+        raise ImportRowError("Row must be a JSON object.")
+
+    role = data.get("role")
+    if role not in ROLES:
+        raise ImportRowError(f"Invalid role: {role!r}.")
+
+    text = data.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ImportRowError("Text must be a non-empty string.")
+    if len(text) > MAX_TEXT_LENGTH:
+        raise ImportRowError(f"Text exceeds {MAX_TEXT_LENGTH} characters.")
+
+    created_at = data.get("created_at")
+    parsed = parse_datetime(created_at) if isinstance(created_at, str) else None
+    if parsed is None:
+        raise ImportRowError(f"Invalid created_at: {created_at!r}.")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+
+    status = data.get("status", "done")
+    if status not in STATUSES:
+        raise ImportRowError(f"Invalid status: {status!r}.")
+
+    audio_url = data.get("audio_url") or None
+    if audio_url is not None and not isinstance(audio_url, str):
+        raise ImportRowError("audio_url must be a string.")
+
+    return {
+        "role": role,
+        "text": text,
+        "created_at": parsed,
+        "status": status,
+        "audio_url": audio_url,
+    }
+
+
+def import_messages(job, lines, on_batch=None):
+    """
+    Import NDJSON lines into a user's history in bounded batches.
+
+    Each batch is inserted with bulk_create inside its own transaction and
+    the job's checkpoint is advanced in that same transaction, so after a
+    failure the job can be resumed by feeding it the same input again: lines
+    already covered by committed batches are skipped.
+
+    Args:
+        job: MessageImport tracking progress
+        lines: Iterable of NDJSON lines (str or bytes)
+        on_batch: Optional callback receiving per-batch stats
+
+    Returns:
+        Report dict with totals, per-batch throughput and rejected rows
+    """
+    batches = []
+    errors = []
+    pending = []
+    pending_rejected = 0
+    line_no = 0
+
+    def commit():
+        nonlocal pending, pending_rejected
+        started = time.monotonic()
+        with transaction.atomic():
+            if pending:
+                # bulk_create skips Message.save(), so reserve the sync range here
+                last_seq = allocate_seq(job.user_id, len(pending))
+                for offset, message in enumerate(pending, start=last_seq - len(pending) + 1):
+                    message.sync_seq = offset
+            Message.objects.bulk_create(pending, batch_size=job.batch_size)
+            job.lines_committed = line_no
+            job.batches_committed += 1
+            job.rows_committed += len(pending)
+            job.rows_rejected += pending_rejected
+            job.save(update_fields=[
+                "lines_committed", "batches_committed", "rows_committed",
+                "rows_rejected", "updated_at"
+            ])
+        elapsed = time.monotonic() - started
+
+        stats = {
+            "batch": job.batches_committed,
+            "rows": len(pending),
+            "rejected": pending_rejected,
+            "seconds": round(elapsed, 4),
+            "rows_per_second": round(len(pending) / elapsed, 1) if elapsed else None,
+        }
+        batches.append(stats)
+        logger.info(f"Import {job.id} batch {stats['batch']}: {stats['rows']} rows in {stats['seconds']}s")
+        if on_batch:
+            on_batch(stats)
+
+        pending = []
+        pending_rejected = 0
+
+    try:
+        for line_no, line in enumerate(lines, start=1):
+            if line_no <= job.lines_committed:
+                continue
+
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            if not line.strip():
+                continue
+
+            try:
+                fields = validate_row(json.loads(line))
+            except ValueError as e:
+                pending_rejected += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"line": line_no, "error": str(e)})
+                continue
+
+            pending.append(Message(user_id=job.user_id, **fields))
+            if len(pending) >= job.batch_size:
+                commit()
+
+        if pending or pending_rejected:
+            commit()
+
+        job.status = "done"
+        job.error = ""
+        job.save(update_fields=["status", "error", "updated_at"])
+
+    except Exception as e:
+        # Drop counters bumped by a batch whose transaction rolled back
+        job.refresh_from_db(fields=["lines_committed", "batches_committed", "rows_committed", "rows_rejected"])
+        logger.error(f"Import {job.id} failed after {job.batches_committed} batches: {e}")
+        job.status = "failed"
+        job.error = str(e)
+        job.save(update_fields=["status", "error", "updated_at"])
+        raise
+
+    return {
+        "import_id": str(job.id),
+        "status": job.status,
+        "batches_committed": job.batches_committed,
+        "rows_committed": job.rows_committed,
+        "rows_rejected": job.rows_rejected,
+        "batches": batches,
+        "errors": errors,
+    }
@@ -0,0 +1,73 @@
+"""
+In-process fast path for stream events.
+
+Sockets (and SSE streams) register a callback here for their user. Events
+for that user are handed to local callbacks directly and only then
+published to the channel layer for sockets held by other processes; the
+channel-layer copy is tagged with PROCESS_ID so local sockets can skip the
+events they already got. With WS_SINGLE_PROCESS the channel-layer publish
+is skipped altogether.
+"""
+import asyncio
+import itertools
+import threading
+import uuid
+
+PROCESS_ID = uuid.uuid4().hex
+
+
+class LocalRegistry:
+    def __init__(self):
+        self._sinks = {}
+        self._lock = threading.Lock()
+        self._tokens = itertools.count(1)
+
+    def register(self, user_id, callback):
+        """
+        Route the user's events in this process to `callback(message)`.
+
+        The callback always runs on the event loop that registered it.
+
+        Returns:
+            Token for unregister()
+        """
+        token = next(self._tokens)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._sinks.setdefault(str(user_id), {})[token] = (loop, callback)
+        return token
+
+    def unregister(self, user_id, token):
+        with self._lock:
+            sinks = self._sinks.get(str(user_id))
+            if sinks is not None:
+                sinks.pop(token, None)
+                if not sinks:
+                    del self._sinks[str(user_id)]
+
+    def deliver(self, user_id, message):
+        """Hand a message to the user's local sinks; returns how many there were."""
+        with self._lock:
+            sinks = list(self._sinks.get(str(user_id), {}).values())
+        if not sinks:
+            return 0
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for loop, callback in sinks:
+            if loop is running:
+                callback(message)
+            elif not loop.is_closed():
+                # e.g. a sync view streaming via async_to_sync in a worker thread
+                loop.call_soon_threadsafe(callback, message)
+        return len(sinks)
+
+
+local_registry = LocalRegistry()
+
+
+def is_local_echo(event):
+    """True for channel-layer copies of events this process already delivered."""
+    return event.get('origin') == PROCESS_ID
@@ -1,8 +1,11 @@
 import requests
+import httpx
 import os
 import uuid
 import json
+import asyncio
 import logging
+import weakref
 from typing import Dict, Any
 from dotenv import load_dotenv
 
@@ -17,6 +20,10 @@ AUTH = os.getenv("N8N_BASIC_AUTH", "")
 API_HDR = os.getenv("N8N_API_KEY_HEADER", "")
 API_VAL = os.getenv("N8N_API_KEY_VALUE", "")
 
+# Async clients are bound to the event loop that created them; keep one
+# pooled client per loop so keep-alive connections are reused.
+_async_clients = weakref.WeakKeyDictionary()
+
 
 def post_to_workflow(user_id: str, message: str, locale: str, timezone: str = "Asia/Riyadh", message_type: str = "text", audio_file=None) -> str:
     """
@@ -194,6 +201,142 @@ def post_to_workflow(user_id: str, message: str, locale: str, timezone: str = "A
         raise ValueError(f"Invalid response format: {e}")
 
 
+def _get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(45, connect=20),  # 20s connect, 45s read
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def apost_to_workflow(user_id: str, message: str, locale: str, timezone: str = "Asia/Riyadh", message_type: str = "text", audio_file=None) -> str:
+    """
+    Async counterpart of post_to_workflow().
+    
+    Uses a pooled httpx.AsyncClient so a pending n8n call only holds a
+    coroutine rather than a worker thread. Arguments, return value and
+    exceptions (httpx.HTTPError instead of requests.RequestException) match
+    the sync version.
+    """
+    if not N8N_URL:
+        logger.warning("N8N_WEBHOOK_URL not configured, using mock response")
+        return f"Mock response to: {message}"
+    
+    correlation_id = str(uuid.uuid4())
+    
+    headers = {
+        "X-Request-ID": correlation_id
+    }
+    if API_HDR and API_VAL:
+        headers[API_HDR] = API_VAL
+    
+    auth = None
+    if AUTH and ":" in AUTH:
+        user, pw = AUTH.split(":", 1)
+        auth = (user, pw)
+    
+    client = _get_async_client()
+    
+    try:
+        logger.info("Sending async request to n8n workflow", extra={
+            "correlation_id": correlation_id,
+            "user_id": user_id,
+            "message_length": len(message) if isinstance(message, str) else len(str(message)),
+            "locale": locale,
+            "message_type": message_type
+        })
+        
+        if message_type == "voice" and audio_file:
+            files = {
+                'audio_file': (audio_file.name, audio_file, audio_file.content_type)
+            }
+            data = {
+                'user_id': str(user_id),
+                'message_type': message_type,
+                'language': locale,
+                'metadata': json.dumps({
+                    "locale": locale,
+                    "timezone": timezone,
+                    "source": "web",
+                    "audio_format": "webm",
+                    "encoding": "binary"
+                })
+            }
+            response = await client.post(N8N_URL, files=files, data=data, headers=headers, auth=auth)
+        else:
+            payload = {
+                "user_id": str(user_id),
+                "message": message,
+                "message_type": message_type,
+                "language": locale,
+                "metadata": {
+                    "locale": locale,
+                    "timezone": timezone,
+                    "source": "web"
+                }
+            }
+            response = await client.post(N8N_URL, json=payload, headers=headers, auth=auth)
+        
+        response.raise_for_status()
+        logger.info(f"N8N response status: {response.status_code}, content-type: {response.headers.get('content-type', 'unknown')}")
+        
+        return _extract_reply(response, correlation_id)
+        
+    except httpx.TimeoutException:
+        logger.error("Timeout calling n8n workflow", extra={
+            "correlation_id": correlation_id,
+            "user_id": user_id
+        })
+        raise
+        
+    except httpx.HTTPError as e:
+        logger.error(f"Error calling n8n workflow: {e}", extra={
+            "correlation_id": correlation_id,
+            "user_id": user_id,
+            "error": str(e)
+        })
+        raise
+
+
+def _extract_reply(response, correlation_id: str) -> str:
+    """Pull the assistant reply out of an n8n response (requests or httpx)."""
+    if not response.text.strip():
+        logger.warning("N8N returned empty response")
+        return "I received your message but got no response from the AI service. This might be a configuration issue."
+    
+    try:
+        data = response.json()
+    except ValueError as e:
+        logger.error(f"Failed to parse N8N response as JSON: {e}")
+        return f"N8N Response: {response.text}"
+    
+    reply = ""
+    if isinstance(data, dict):
+        reply = data.get("reply", "") or data.get("output", "") or data.get("response", "") or data.get("message", "")
+        if not reply:
+            for key, value in data.items():
+                if isinstance(value, str) and value.strip():
+                    reply = value
+                    break
+    
+    if not reply:
+        logger.warning("Empty reply from n8n workflow", extra={
+            "correlation_id": correlation_id,
+            "response_data": data
+        })
+        return "I apologize, but I couldn't generate a response at the moment. Please try again."
+    
+    logger.info("Received reply from n8n workflow", extra={
+        "correlation_id": correlation_id,
+        "reply_length": len(reply)
+    })
+    return reply
+
+
 def simulate_streaming_response(text: str, chunk_size: int = 10):
     """
     Simulate streaming response by splitting text into chunks.
@@ -0,0 +1,107 @@
+import logging
+
+from django.conf import settings
+
+from audit.middleware import AuditMiddleware
+from ..models import Message
+from .n8n_client import apost_to_workflow
+from .streaming import stream_error, stream_reply
+
+logger = logging.getLogger(__name__)
+
+ERROR_REPLY = 'I apologize, but I encountered an error processing your request. Please try again.'
+VOICE_ERROR_REPLY = 'I apologize, but I encountered an error processing your voice message. Please try again.'
+
+alog_event = AuditMiddleware.alog_event
+
+
+async def start_turn(user, text, audio_url=None, request=None):
+    """
+    Persist the user's message and a queued assistant placeholder.
+
+    Returns:
+        (user_message, assistant_message)
+    """
+    user_message = await Message.objects.acreate(
+        user=user,
+        role='user',
+        text=text,
+        audio_url=audio_url,
+        status='done'
+    )
+
+    await alog_event(
+        user=user,
+        event_type='message_sent',
+        request=request,
+        metadata={'message_id': str(user_message.id), 'text_length': len(text)}
+    )
+
+    assistant_message = await Message.objects.acreate(
+        user=user,
+        role='assistant',
+        text='',
+        status='queued'
+    )
+    return user_message, assistant_message
+
+
+async def complete_turn(user, assistant_message, text, locale, message_type='text', audio_file=None, request=None):
+    """
+    Run the n8n workflow for a turn and stream the reply to the user.
+
+    Never raises for workflow failures: the assistant message is marked as
+    an error and an error event is streamed instead.
+
+    Returns:
+        The updated assistant message
+    """
+    assistant_message.status = 'sent'
+    await assistant_message.asave(update_fields=['status'])
+
+    try:
+        reply_text = await apost_to_workflow(
+            user_id=str(user.id),
+            message=text,
+            locale=locale,
+            timezone=settings.TIME_ZONE,
+            message_type=message_type,
+            audio_file=audio_file
+        )
+
+        await stream_reply(user.id, assistant_message.id, reply_text)
+
+        assistant_message.text = reply_text
+        assistant_message.status = 'done'
+        await assistant_message.asave(update_fields=['text', 'status'])
+
+        await alog_event(
+            user=user,
+            event_type='assistant_response_received',
+            request=request,
+            metadata={
+                'message_id': str(assistant_message.id),
+                'response_length': len(reply_text)
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Error getting assistant response: {e}")
+
+        assistant_message.status = 'error'
+        assistant_message.text = VOICE_ERROR_REPLY if message_type == 'voice' else ERROR_REPLY
+        await assistant_message.asave(update_fields=['text', 'status'])
+
+        await stream_error(user.id, assistant_message.id)
+
+        await alog_event(
+            user=user,
+            event_type='assistant_response_error',
+            request=request,
+            metadata={
+                'message_id': str(assistant_message.id),
+                'error': str(e)
+            }
+        )
+
+    return assistant_message
@@ -0,0 +1,83 @@
+import asyncio
+from collections import deque
+
+# Safe to shed when a socket is hopelessly behind; everything else is kept
+DROPPABLE_EVENTS = {"heartbeat", "pong"}
+
+
+def merge_delta(target, delta):
+    """Fold a later delta of the same message into a queued one."""
+    target["data"] = target.get("data", "") + delta.get("data", "")
+    target["seq"] = delta.get("seq", target.get("seq"))
+
+
+class SendQueue:
+    """
+    Bounded outbound event queue for one websocket.
+
+    A delta arriving while the previous queued event is a delta of the same
+    message is merged into it, so a client that falls behind gets fewer,
+    larger frames (carrying the seq of the last merged delta). When the
+    queue still outgrows `maxsize`, deltas of each message are merged across
+    the whole queue and then heartbeats are shed. Other events -- done and
+    error in particular -- are never dropped.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = max(maxsize, 1)
+        self.merged = 0
+        self.dropped = 0
+        # Deepest the queue has been, for the per-connection peak metric
+        self.high_water = 0
+        self._items = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, event):
+        items = self._items
+        if event.get("type") == "delta" and items:
+            last = items[-1]
+            if last.get("type") == "delta" and last.get("message_id") == event.get("message_id"):
+                merge_delta(last, event)
+                self.merged += 1
+                return
+
+        # Copy: the channel-layer message may be shared and we merge in place
+        items.append(dict(event))
+        if len(items) > self.maxsize:
+            self._compact()
+        self.high_water = max(self.high_water, len(self._items))
+        self._ready.set()
+
+    def _compact(self):
+        compacted = []
+        open_deltas = {}  # message_id -> index of its trailing delta in compacted
+        for event in self._items:
+            event_type = event.get("type")
+            message_id = event.get("message_id")
+            if event_type == "delta" and message_id in open_deltas:
+                merge_delta(compacted[open_deltas[message_id]], event)
+                self.merged += 1
+                continue
+            if message_id is not None:
+                open_deltas.pop(message_id, None)
+            if event_type == "delta":
+                open_deltas[message_id] = len(compacted)
+            compacted.append(event)
+
+        while len(compacted) > self.maxsize:
+            index = next((i for i, e in enumerate(compacted) if e.get("type") in DROPPABLE_EVENTS), None)
+            if index is None:
+                break
+            del compacted[index]
+            self.dropped += 1
+
+        self._items = deque(compacted)
+
+    async def get(self):
+        while not self._items:
+            self._ready.clear()
+            await self._ready.wait()
+        return self._items.popleft()
@@ -0,0 +1,208 @@
+import logging
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from core import metrics
+from core.redis_client import get_async_redis, redis_enabled
+from .local_delivery import PROCESS_ID, local_registry
+from .n8n_client import simulate_streaming_response
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("neora_stream_events_local_total", "Stream events handed to sockets in this process directly")
+metrics.describe("neora_stream_events_published_total", "Stream events published to the channel layer")
+
+DELTA_LOG_KEY = "stream:deltas:{}:{}"
+
+
+def user_group(user_id):
+    """Channel-layer group joined by every stream socket of a user."""
+    return f"user_{user_id}"
+
+
+class RedisDeltaLog:
+    """
+    Short-lived Redis stream of the events sent for one assistant message.
+
+    Entry ids are ``0-<seq>`` so a resume can range-read exactly the
+    events after the client's last sequence number.
+    """
+
+    async def append(self, user_id, message_id, seq, event_type, data=""):
+        key = DELTA_LOG_KEY.format(user_id, message_id)
+        pipe = get_async_redis().pipeline(transaction=False)
+        pipe.xadd(key, {"type": event_type, "data": data}, id=f"0-{seq}",
+                  maxlen=settings.STREAM_REPLAY_MAXLEN, approximate=True)
+        pipe.expire(key, settings.STREAM_REPLAY_TTL)
+        await pipe.execute()
+
+    async def exists(self, user_id, message_id):
+        return bool(await get_async_redis().exists(DELTA_LOG_KEY.format(user_id, message_id)))
+
+    async def read_after(self, user_id, message_id, last_seq):
+        key = DELTA_LOG_KEY.format(user_id, message_id)
+        entries = await get_async_redis().xrange(key, min=f"0-{last_seq + 1}")
+        return [
+            (int(entry_id.split(b"-")[1]), fields[b"type"].decode(), fields[b"data"].decode("utf-8"))
+            for entry_id, fields in entries
+        ]
+
+    async def last_seq(self, user_id, message_id):
+        entries = await get_async_redis().xrevrange(DELTA_LOG_KEY.format(user_id, message_id), count=1)
+        return int(entries[0][0].split(b"-")[1]) if entries else 0
+
+
+class MemoryDeltaLog:
+    """Per-process log used with WS_SINGLE_PROCESS or when REDIS_URL is not a Redis server."""
+
+    def __init__(self):
+        self._logs = {}
+        self._next_purge = 0
+
+    def _purge(self, now):
+        # Sweep at most once a second; this sits on the per-delta path
+        if now < self._next_purge:
+            return
+        self._next_purge = now + 1
+        for key in [k for k, (expires_at, _) in self._logs.items() if expires_at <= now]:
+            del self._logs[key]
+
+    async def append(self, user_id, message_id, seq, event_type, data=""):
+        now = time.monotonic()
+        self._purge(now)
+        key = DELTA_LOG_KEY.format(user_id, message_id)
+        _, entries = self._logs.get(key, (None, []))
+        entries.append((seq, event_type, data))
+        del entries[:-settings.STREAM_REPLAY_MAXLEN]
+        self._logs[key] = (now + settings.STREAM_REPLAY_TTL, entries)
+
+    def _entries(self, user_id, message_id):
+        now = time.monotonic()
+        self._purge(now)
+        expires_at, entries = self._logs.get(DELTA_LOG_KEY.format(user_id, message_id), (0, None))
+        return entries if expires_at > now else None
+
+    async def exists(self, user_id, message_id):
+        return self._entries(user_id, message_id) is not None
+
+    async def read_after(self, user_id, message_id, last_seq):
+        entries = self._entries(user_id, message_id) or []
+        return [entry for entry in entries if entry[0] > last_seq]
+
+    async def last_seq(self, user_id, message_id):
+        entries = self._entries(user_id, message_id)
+        return entries[-1][0] if entries else 0
+
+
+_memory_log = MemoryDeltaLog()
+
+
+def get_delta_log():
+    # A single process replays from its own memory: every resume lands here,
+    # and Redis stays off the per-delta path
+    if settings.WS_SINGLE_PROCESS or not redis_enabled():
+        return _memory_log
+    return RedisDeltaLog()
+
+
+def build_event(message_id, seq, event_type, data=""):
+    """Client-facing payload for a logged stream event."""
+    event = {'type': event_type, 'message_id': str(message_id), 'seq': seq}
+    if event_type == 'delta':
+        event['data'] = data
+    elif event_type == 'error':
+        event.update({'code': 'assistant_error', 'message': data})
+    return event
+
+
+async def send_event(user_id, message):
+    """
+    Deliver one stream event to all of a user's stream consumers.
+
+    Consumers in this process get it in memory; the channel-layer copy for
+    other processes carries our PROCESS_ID so local consumers skip it.
+    """
+    if local_registry.deliver(user_id, message):
+        metrics.incr("neora_stream_events_local_total")
+    if settings.WS_SINGLE_PROCESS:
+        return
+
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        logger.warning(f"Channel layer not available, dropping {message.get('type')} for user {user_id}")
+        return
+
+    await channel_layer.group_send(
+        user_group(user_id),
+        {
+            'type': 'stream_message',
+            'message': message,
+            'origin': PROCESS_ID
+        }
+    )
+    metrics.incr("neora_stream_events_published_total")
+
+
+async def send_logged_event(user_id, message_id, seq, event_type, data=""):
+    """
+    Record a stream event for resume, then deliver it.
+
+    The event is logged before it is sent so a client that reconnects while
+    the reply is still streaming can never miss a sequence number; it may
+    see one twice and should drop events with seq <= the last it applied.
+    """
+    try:
+        await get_delta_log().append(user_id, message_id, seq, event_type, data)
+    except Exception as e:
+        # Resume is best effort; live delivery must not depend on it
+        logger.warning(f"Failed to log {event_type} #{seq} for message {message_id}: {e}")
+
+    await send_event(user_id, build_event(message_id, seq, event_type, data))
+
+
+async def replay_events(user_id, message_id, last_seq):
+    """
+    Logged events for a message after `last_seq`.
+
+    Returns:
+        List of client payloads, or None if nothing is logged for the
+        message (expired or never streamed)
+    """
+    delta_log = get_delta_log()
+    entries = await delta_log.read_after(user_id, message_id, max(last_seq, 0))
+    if not entries and not await delta_log.exists(user_id, message_id):
+        return None
+    return [build_event(message_id, seq, event_type, data) for seq, event_type, data in entries]
+
+
+async def stream_reply(user_id, message_id, text):
+    """Stream an assistant reply as delta chunks followed by a done event."""
+    message_id = str(message_id)
+    logger.info(f"Starting streaming for user {user_id}, message {message_id}")
+
+    seq = 0
+    for chunk in simulate_streaming_response(text):
+        seq += 1
+        await send_logged_event(user_id, message_id, seq, 'delta', chunk)
+
+    logger.info(f"Sending completion signal for message {message_id}")
+    await send_logged_event(user_id, message_id, seq + 1, 'done')
+
+
+async def stream_error(user_id, message_id):
+    """
+    Send the error event for a reply, after whatever was already streamed.
+
+    The reply may have failed part way, so the error takes the next seq
+    after the last logged event; clients drop events with a seq they have
+    already applied.
+    """
+    message_id = str(message_id)
+    try:
+        seq = await get_delta_log().last_seq(user_id, message_id) + 1
+    except Exception as e:
+        logger.warning(f"Could not read the last seq for message {message_id}: {e}")
+        seq = 1
+    await send_logged_event(user_id, message_id, seq, 'error', 'Failed to get assistant response')
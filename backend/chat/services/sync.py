@@ -0,0 +1,96 @@
+import logging
+
+from django.db import transaction
+from django.db.models import F
+
+from ..models import ChangeSequence, Message, MessageClear
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidSyncToken(ValueError):
+    """Raised when a client sends a sync token we did not issue."""
+
+
+def allocate_seq(user_id, count=1):
+    """
+    Reserve `count` consecutive change sequence numbers for a user.
+
+    Must be called inside the transaction that writes the changed rows: the
+    UPDATE keeps the counter row locked until commit, so concurrent writers
+    commit in sequence order and a sync can never skip over a row that
+    becomes visible later.
+
+    Returns:
+        The last reserved sequence number
+    """
+    with transaction.atomic():
+        updated = ChangeSequence.objects.filter(user_id=user_id).update(value=F("value") + count)
+        if not updated:
+            ChangeSequence.objects.get_or_create(user_id=user_id)
+            ChangeSequence.objects.filter(user_id=user_id).update(value=F("value") + count)
+        return ChangeSequence.objects.filter(user_id=user_id).values_list("value", flat=True).get()
+
+
+def current_seq(user_id):
+    return ChangeSequence.objects.filter(user_id=user_id).values_list("value", flat=True).first() or 0
+
+
+def parse_sync_token(token):
+    if token in (None, ""):
+        return 0
+    try:
+        seq = int(token)
+    except (TypeError, ValueError):
+        raise InvalidSyncToken(f"Invalid sync token: {token!r}")
+    if seq < 0:
+        raise InvalidSyncToken(f"Invalid sync token: {token!r}")
+    return seq
+
+
+def record_clear(user_id):
+    """
+    Delete a user's messages and leave a tombstone for syncing clients.
+
+    Returns:
+        Number of deleted messages
+    """
+    with transaction.atomic():
+        seq = allocate_seq(user_id)
+        deleted_count, _ = Message.objects.filter(user_id=user_id).delete()
+        MessageClear.objects.create(user_id=user_id, seq=seq, deleted_count=deleted_count)
+    return deleted_count
+
+
+def changes_since(user_id, since, limit):
+    """
+    Collect everything that changed for a user after `since`.
+
+    Returns:
+        dict with the changed messages (oldest change first), whether the
+        history was cleared in between, whether more changes are pending
+        and the token to send on the next sync
+    """
+    # Read the high-water mark first so rows committed while we query are
+    # picked up by the next sync rather than skipped.
+    high_water = current_seq(user_id)
+
+    cleared = MessageClear.objects.filter(
+        user_id=user_id, seq__gt=since, seq__lte=high_water
+    ).order_by("-seq").values_list("seq", flat=True).first()
+
+    messages = list(
+        Message.objects.filter(user_id=user_id, sync_seq__gt=since, sync_seq__lte=high_water)
+        .order_by("sync_seq")[:limit + 1]
+    )
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+
+    next_token = messages[-1].sync_seq if has_more else high_water
+
+    return {
+        "messages": messages,
+        "cleared": cleared is not None,
+        "has_more": has_more,
+        "sync_token": str(max(next_token, since)),
+    }
@@ -1,3 +1,366 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .async_views import sse_events
+from .models import Message, MessageImport
+from .services import framing
+from .services.importer import import_messages
+from .services.local_delivery import local_registry
+from .services.send_queue import SendQueue
+from .services.streaming import MemoryDeltaLog, build_event, get_delta_log
+from .services.sync import InvalidSyncToken, changes_since, parse_sync_token, record_clear
+
+# Run against the in-process fallbacks so the suite needs no Redis
+memory_backends = override_settings(
+    REDIS_URL='memory://',
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+)
+
+
+@memory_backends
+class SSEResumeTests(SimpleTestCase):
+    async def test_resume_replays_missed_events_then_streams_live(self):
+        delta_log = get_delta_log()
+        await delta_log.append(7, 'msg-1', 1, 'delta', 'Hello')
+        await delta_log.append(7, 'msg-1', 2, 'delta', ' there')
+
+        stream = sse_events(7, 'msg-1:1')
+        try:
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            replayed = await anext(stream)
+            self.assertIn('id: msg-1:2', replayed)
+            self.assertIn('" there"', replayed)
+
+            local_registry.deliver(7, build_event('msg-1', 3, 'done'))
+            self.assertIn('id: msg-1:3', await anext(stream))
+        finally:
+            await stream.aclose()
+
+    async def test_resume_of_unknown_message_reports_unavailable(self):
+        stream = sse_events(7, 'missing:4')
+        try:
+            await anext(stream)
+            self.assertIn('resume_unavailable', await anext(stream))
+        finally:
+            await stream.aclose()
+
+
+@memory_backends
+class DeltaLogTests(SimpleTestCase):
+    async def test_error_follows_the_streamed_deltas(self):
+        from .services.streaming import stream_error
+
+        delta_log = get_delta_log()
+        await delta_log.append(7, 'msg-2', 1, 'delta', 'Hel')
+        await delta_log.append(7, 'msg-2', 2, 'delta', 'lo')
+        await stream_error(7, 'msg-2')
+
+        self.assertEqual(await delta_log.last_seq(7, 'msg-2'), 3)
+        [(seq, event_type, _)] = await delta_log.read_after(7, 'msg-2', 2)
+        self.assertEqual((seq, event_type), (3, 'error'))
+
+    def test_single_process_keeps_the_log_in_memory(self):
+        with self.settings(WS_SINGLE_PROCESS=True, REDIS_URL='redis://localhost:6379/0'):
+            self.assertIsInstance(get_delta_log(), MemoryDeltaLog)
+
+
+@memory_backends
+class StreamResumeTests(SimpleTestCase):
+    async def test_socket_resume_replays_only_the_missed_events(self):
+        from channels.testing import WebsocketCommunicator
+
+        from .consumers import StreamConsumer
+        from .services.streaming import stream_reply
+
+        words = [f'w{i}' for i in range(25)]
+        await stream_reply(9, 'msg-r', ' '.join(words))
+
+        communicator = WebsocketCommunicator(StreamConsumer.as_asgi(), "/ws/stream/")
+        communicator.scope["user"] = mock.Mock(id=9, email='r@example.com', is_authenticated=True)
+        await communicator.connect()
+        await communicator.receive_json_from()
+        await communicator.send_json_to({'type': 'resume', 'message_id': 'msg-r', 'last_seq': 1})
+        events = [await communicator.receive_json_from() for _ in range(4)]
+        await communicator.disconnect()
+
+        self.assertEqual([(e['type'], e.get('seq')) for e in events],
+                         [('delta', 2), ('delta', 3), ('done', 4), ('resumed', None)])
+        self.assertEqual(events[-1]['replayed'], 3)
+        self.assertEqual(''.join(e['data'] for e in events[:2]).split(), words[10:])
+
+
+@memory_backends
+class ConnectionRegistryTests(SimpleTestCase):
+    async def test_socket_is_accepted_when_the_registry_is_down(self):
+        from channels.testing import WebsocketCommunicator
+
+        from .consumers import StreamConsumer
+        from .services import connections
+
+        class DownRegistry:
+            async def register(self, *args):
+                raise ConnectionError("Redis is down")
+
+        user = mock.Mock(id=7, email='u@example.com', is_authenticated=True)
+        communicator = WebsocketCommunicator(StreamConsumer.as_asgi(), "/ws/stream/")
+        communicator.scope["user"] = user
+        with mock.patch.object(connections, 'get_connection_registry', return_value=DownRegistry()):
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual((await communicator.receive_json_from())['status'], 'connected')
+        await communicator.disconnect()
+
+    async def test_ping_is_answered_through_the_send_queue(self):
+        from channels.testing import WebsocketCommunicator
+
+        from .consumers import StreamConsumer
+
+        communicator = WebsocketCommunicator(StreamConsumer.as_asgi(), "/ws/stream/")
+        communicator.scope["user"] = mock.Mock(id=8, email='p@example.com', is_authenticated=True)
+        await communicator.connect()
+        await communicator.receive_json_from()
+        await communicator.send_json_to({'type': 'ping', 'timestamp': 5})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong', 'timestamp': 5})
+        await communicator.disconnect()
+
+
+class SendQueueTests(SimpleTestCase):
+    def test_backlog_is_merged_and_only_heartbeats_are_shed(self):
+        queue = SendQueue(maxsize=2)
+        queue.put(build_event('msg-1', 1, 'delta', 'a'))
+        queue.put(build_event('msg-1', 2, 'delta', 'b'))
+        queue.put({'type': 'heartbeat'})
+        queue.put(build_event('msg-1', 3, 'done'))
+        queue.put({'type': 'heartbeat'})
+
+        self.assertEqual([(e['type'], e.get('seq'), e.get('data')) for e in queue._items],
+                         [('delta', 2, 'ab'), ('done', 3, None)])
+        self.assertEqual((queue.merged, queue.dropped), (1, 2))
+        self.assertEqual(queue.high_water, 2)
+
+    def test_peak_depth_is_counted_per_connection(self):
+        from core import metrics
+
+        from .consumers import _observe_queue_peak
+
+        def bucket(le):
+            return metrics.snapshot()['counters'].get(f'neora_ws_send_queue_peak_total{{le="{le}"}}', 0)
+
+        before = {le: bucket(le) for le in ('1', '4', '16', '+Inf')}
+        _observe_queue_peak(3)
+        self.assertEqual({le: bucket(le) - before[le] for le in before},
+                         {'1': 0, '4': 1, '16': 1, '+Inf': 1})
+
+
+class FramingTests(SimpleTestCase):
+    def test_json_round_trip_keeps_non_ascii_text(self):
+        codec = framing.JSONCodec()
+        event = build_event('msg-1', 1, 'delta', 'مرحبا')
+        [frame] = codec.encode(event)
+        self.assertIn('مرحبا', frame)
+        self.assertEqual(codec.decode(frame), event)
+
+    def test_msgpack_binds_each_message_id_once(self):
+        codec = framing.MsgpackCodec()
+        frames = codec.encode(build_event('msg-1', 1, 'delta', 'Hel'))
+        frames += codec.encode(build_event('msg-1', 2, 'delta', 'lo'))
+        frames += codec.encode(build_event('msg-1', 3, 'error', 'boom'))
+        frames += codec.encode(build_event('msg-2', 1, 'done'))
+        self.assertEqual([msgpack.unpackb(frame) for frame in frames], [
+            [framing.BIND, 0, 'msg-1'],
+            [framing.DELTA, 0, 1, 'Hel'],
+            [framing.DELTA, 0, 2, 'lo'],
+            [framing.ERROR, 0, 3, 'assistant_error', 'boom'],
+            [framing.BIND, 1, 'msg-2'],
+            [framing.DONE, 1, 1],
+        ])
+
+    def test_msgpack_round_trips_other_events_as_maps(self):
+        codec = framing.MsgpackCodec()
+        event = {'type': 'pong', 'timestamp': 5}
+        [frame] = codec.encode(event)
+        self.assertEqual(codec.decode(frame), event)
+        with self.assertRaises(ValueError):
+            codec.decode(msgpack.packb([1, 2]))
+
+    def test_negotiate_prefers_msgpack(self):
+        codec, subprotocol = framing.negotiate([framing.JSON_SUBPROTOCOL, framing.MSGPACK_SUBPROTOCOL])
+        self.assertIsInstance(codec, framing.MsgpackCodec)
+        self.assertEqual(subprotocol, framing.MSGPACK_SUBPROTOCOL)
+        codec, subprotocol = framing.negotiate(None)
+        self.assertIsInstance(codec, framing.JSONCodec)
+        self.assertIsNone(subprotocol)
+
+
+@memory_backends
+class BadFrameTests(SimpleTestCase):
+    async def _connect(self, subprotocols=None):
+        from channels.testing import WebsocketCommunicator
+
+        from .consumers import StreamConsumer
+
+        communicator = WebsocketCommunicator(StreamConsumer.as_asgi(), "/ws/stream/", subprotocols=subprotocols)
+        communicator.scope["user"] = mock.Mock(id=10, email='f@example.com', is_authenticated=True)
+        await communicator.connect()
+        return communicator
+
+    async def test_bad_json_frame_is_reported_and_the_socket_stays_open(self):
+        communicator = await self._connect()
+        await communicator.receive_json_from()
+        for frame in ('{not json', '[1, 2]'):
+            await communicator.send_to(text_data=frame)
+            self.assertEqual((await communicator.receive_json_from())['code'], 'invalid_frame')
+        await communicator.send_json_to({'type': 'ping', 'timestamp': 1})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong', 'timestamp': 1})
+        await communicator.disconnect()
+
+    async def test_bad_msgpack_frame_is_reported_and_the_socket_stays_open(self):
+        communicator = await self._connect([framing.MSGPACK_SUBPROTOCOL])
+
+        async def receive():
+            return msgpack.unpackb(await communicator.receive_from())
+
+        self.assertEqual((await receive())['status'], 'connected')
+        await communicator.send_to(bytes_data=b'\xc1')
+        self.assertEqual((await receive())['code'], 'invalid_frame')
+        await communicator.send_to(bytes_data=msgpack.packb({'type': 'ping', 'timestamp': 2}))
+        self.assertEqual(await receive(), {'type': 'pong', 'timestamp': 2})
+        await communicator.disconnect()
+
+
+@memory_backends
+class SyncTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='s@example.com', password='S3cure-pass-123')
+
+    def _message(self, text):
+        return Message.objects.create(user=self.user, role='user', text=text)
+
+    def test_parse_sync_token(self):
+        self.assertEqual(parse_sync_token(None), 0)
+        self.assertEqual(parse_sync_token(''), 0)
+        self.assertEqual(parse_sync_token('12'), 12)
+        for token in ('abc', '-1', '1.5'):
+            with self.assertRaises(InvalidSyncToken):
+                parse_sync_token(token)
+
+    def test_seq_is_allocated_only_when_synced_fields_change(self):
+        first, second = self._message('one'), self._message('two')
+        self.assertEqual((first.sync_seq, second.sync_seq), (1, 2))
+
+        first.save()
+        first.save(update_fields=['status'])
+        self.assertEqual(Message.objects.get(pk=first.pk).sync_seq, 1)
+
+        first = Message.objects.get(pk=first.pk)
+        first.status = 'error'
+        first.save(update_fields=['status'])
+        self.assertEqual(Message.objects.get(pk=first.pk).sync_seq, 3)
+
+    def test_changes_are_paged_in_seq_order(self):
+        messages = [self._message(f'm{i}') for i in range(3)]
+
+        page = changes_since(self.user.id, 0, 2)
+        self.assertEqual(page['messages'], messages[:2])
+        self.assertTrue(page['has_more'])
+        self.assertEqual(page['sync_token'], '2')
+
+        page = changes_since(self.user.id, int(page['sync_token']), 2)
+        self.assertEqual(page['messages'], messages[2:])
+        self.assertFalse(page['has_more'])
+        self.assertEqual(page['sync_token'], '3')
+
+        page = changes_since(self.user.id, 3, 2)
+        self.assertEqual((page['messages'], page['has_more'], page['sync_token']), ([], False, '3'))
+
+    def test_clear_is_reported_once(self):
+        self._message('old')
+        token = int(changes_since(self.user.id, 0, 10)['sync_token'])
+
+        self.assertEqual(record_clear(self.user.id), 1)
+        self._message('new')
+        page = changes_since(self.user.id, token, 10)
+        self.assertTrue(page['cleared'])
+        self.assertEqual([m.text for m in page['messages']], ['new'])
+
+        page = changes_since(self.user.id, int(page['sync_token']), 10)
+        self.assertFalse(page['cleared'])
+
+    def test_sync_endpoint_rejects_a_bad_token(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/messages/sync/', {'token': 'nope'}).status_code, 400)
+        response = client.get('/api/messages/sync/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['sync_token'], '0')
+
+
+@memory_backends
+class ImportResumeViewTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='i@example.com', password='S3cure-pass-123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _resume(self, job):
+        row = '{"role": "user", "text": "hi", "created_at": "2025-01-01T00:00:00Z"}\n'
+        return self.client.post(f'/api/messages/import/?resume={job.id}', data=row,
+                                content_type='application/x-ndjson')
+
+    def test_running_import_cannot_be_resumed(self):
+        job = MessageImport.objects.create(user=self.user, status='running')
+        self.assertEqual(self._resume(job).status_code, 409)
+
+    def test_failed_import_is_claimed_and_finished(self):
+        job = MessageImport.objects.create(user=self.user, status='failed')
+        response = self._resume(job)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['rows_committed'], 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(self._resume(job).status_code, 409)
+
+
+@memory_backends
+class ImporterTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='b@example.com', password='S3cure-pass-123')
+        self.lines = [
+            json.dumps({'role': 'user', 'text': f'm{i}', 'created_at': f'2025-01-01T00:00:0{i}Z'})
+            for i in range(5)
+        ]
+        self.lines.insert(2, '{"role": "robot", "text": "x", "created_at": "2025-01-01T00:00:00Z"}')
+
+    def test_batches_commit_and_bad_rows_are_rejected(self):
+        job = MessageImport.objects.create(user=self.user, batch_size=2)
+        report = import_messages(job, self.lines)
+
+        self.assertEqual(report['status'], 'done')
+        self.assertEqual([b['rows'] for b in report['batches']], [2, 2, 1])
+        self.assertEqual((report['rows_committed'], report['rows_rejected']), (5, 1))
+        self.assertEqual(report['errors'][0]['line'], 3)
+        self.assertEqual(list(Message.objects.filter(user=self.user).values_list('sync_seq', flat=True)),
+                         [1, 2, 3, 4, 5])
+
+    def test_resume_skips_the_committed_batches(self):
+        def failing(lines, after):
+            for line_no, line in enumerate(lines, start=1):
+                if line_no > after:
+                    raise OSError('upload interrupted')
+                yield line
+
+        job = MessageImport.objects.create(user=self.user, batch_size=2)
+        with self.assertRaises(OSError):
+            import_messages(job, failing(self.lines, after=4))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_committed, job.lines_committed), ('failed', 2, 2))
+
+        report = import_messages(job, self.lines)
+        self.assertEqual((report['rows_committed'], report['rows_rejected']), (5, 1))
+        self.assertEqual(sorted(Message.objects.filter(user=self.user).values_list('text', flat=True)),
+                         [f'm{i}' for i in range(5)])
@@ -1,9 +1,15 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
-    path('messages/', views.messages_view, name='messages'),
-    path('voice/', views.upload_voice, name='upload_voice'),
+    path('messages/', async_views.messages_view, name='messages'),
+    path('voice/', async_views.upload_voice, name='upload_voice'),
+    path('stream/', async_views.stream_events, name='stream_events'),
     path('messages/clear/', views.clear_messages, name='clear_messages'),
+    path('messages/sync/', views.sync_messages, name='sync_messages'),
+    path('messages/import/', views.import_messages, name='import_messages'),
+    path('messages/export/', async_views.export_messages, name='export_messages'),
+    path('messages/export/<uuid:export_id>/', views.export_status, name='export_status'),
+    path('messages/export/<uuid:export_id>/download/', views.export_download, name='export_download'),
 ]
 
@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_login_failed
+        from django.db.models.signals import post_save
+        from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+        from .lockout import on_login_failed
+        from .token_blacklist import on_token_blacklisted
+
+        post_save.connect(on_token_blacklisted, sender=BlacklistedToken, dispatch_uid='core.token_blacklist')
+        user_login_failed.connect(on_login_failed, dispatch_uid='core.lockout')
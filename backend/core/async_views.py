@@ -0,0 +1,114 @@
+"""
+Native async versions of the hot auth/profile endpoints.
+
+See chat/async_views.py; the remaining auth endpoints are DRF views in
+core/views.py.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from audit.middleware import AuditMiddleware
+from .auth import (
+    access_token_from_refresh, async_jwt_required, load_user_row, reissue_access_token, set_auth_cookies
+)
+from . import views
+from .hash_pool import hash_pool_view
+from .health import readiness
+from .http import request_data
+from .lockout import lockout_view
+from .serializers import UserProfileSerializer
+from .throttling import throttle
+
+logger = logging.getLogger(__name__)
+
+
+@require_http_methods(['GET', 'HEAD'])
+async def live(request):
+    """Liveness probe: the process is serving requests. Never touches dependencies."""
+    return JsonResponse({'status': 'alive'})
+
+
+@require_http_methods(['GET', 'HEAD'])
+async def ready(request):
+    """Readiness probe from the background prober's cached results (core/health.py)."""
+    is_ready, checks = readiness()
+    return JsonResponse({
+        'status': 'ready' if is_ready else 'not ready',
+        'checks': checks,
+    }, status=200 if is_ready else 503)
+
+
+@csrf_exempt
+@require_http_methods(['GET', 'PATCH'])
+@async_jwt_required
+async def profile(request):
+    """Get or update user profile."""
+    user = await sync_to_async(load_user_row)(request.user)
+
+    if request.method == 'GET':
+        return JsonResponse(UserProfileSerializer(user).data)
+
+    try:
+        data = request_data(request)
+    except ValueError as e:
+        return JsonResponse({'detail': f'JSON parse error - {e}'}, status=400)
+
+    serializer = UserProfileSerializer(user, data=data, partial=True)
+
+    if serializer.is_valid():
+        await sync_to_async(serializer.save)()
+
+        await AuditMiddleware.alog_event(
+            user=user,
+            event_type='profile_updated',
+            request=request,
+            metadata=data
+        )
+
+        response = JsonResponse(serializer.data)
+        access_token = reissue_access_token(user, request.auth)
+        if access_token is not None:
+            set_auth_cookies(response, access_token)
+        return response
+
+    return JsonResponse(serializer.errors, status=400)
+
+
+@csrf_exempt
+@require_http_methods(['POST'])
+async def refresh_token(request):
+    """Refresh JWT tokens."""
+    raw_refresh_token = request.COOKIES.get('refresh_token')
+
+    if not raw_refresh_token:
+        return JsonResponse({
+            'error': 'Refresh token not found.'
+        }, status=401)
+
+    try:
+        # Validation checks the blacklist tables, so it goes through the ORM thread
+        access_token = await sync_to_async(access_token_from_refresh)(raw_refresh_token)
+
+        response = JsonResponse({
+            'message': 'Token refreshed successfully.'
+        })
+        return set_auth_cookies(response, access_token)
+
+    except Exception as e:
+        logger.error(f"Token refresh error: {e}")
+        return JsonResponse({
+            'error': 'Invalid refresh token.'
+        }, status=401)
+
+
+# Password hashing dominates these; the sync views run in the bounded
+# hashing pool instead of the shared sync thread (see core/hash_pool.py).
+# Throttled first so a flood never reaches the pool; locked-out logins are
+# refused before hashing (see core/lockout.py).
+login = throttle('login')(lockout_view(hash_pool_view(views.login, op='login')))
+register = throttle('register')(hash_pool_view(views.register, op='register'))
+reset_password = throttle('reset_password')(hash_pool_view(views.reset_password, op='reset_password'))
@@ -1,7 +1,85 @@
+from functools import wraps
 from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
 from rest_framework.authentication import BaseAuthentication
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+ACCESS_COOKIE_MAX_AGE = 60 * 10  # 10 minutes
+REFRESH_COOKIE_MAX_AGE = 60 * 60 * 24 * 14  # 14 days
+
+# User fields copied into access tokens when JWT_CLAIMS_AUTH is on
+USER_CLAIMS = ('email', 'preferred_language', 'is_active', 'is_email_verified')
+
+
+def add_user_claims(access_token, user):
+    """Embed USER_CLAIMS in an access token (no-op unless JWT_CLAIMS_AUTH)."""
+    if settings.JWT_CLAIMS_AUTH:
+        for claim in USER_CLAIMS:
+            access_token[claim] = getattr(user, claim)
+    return access_token
+
+
+def user_from_claims(validated_token):
+    """Build the token's user from its claims, without a query.
+
+    Returns None unless JWT_CLAIMS_AUTH is on and the token carries the
+    claims (tokens issued before it was enabled fall back to a lookup).
+    The result is a real User instance with every other column deferred, so
+    it works as a foreign key value; touching a deferred column queries it
+    (see load_user_row).
+    """
+    if not settings.JWT_CLAIMS_AUTH:
+        return None
+    if not all(claim in validated_token for claim in USER_CLAIMS):
+        return None
+
+    User = get_user_model()
+    claims = {claim: validated_token[claim] for claim in USER_CLAIMS}
+    claims[api_settings.USER_ID_FIELD] = validated_token[api_settings.USER_ID_CLAIM]
+
+    fields = [f for f in User._meta.concrete_fields if f.attname in claims]
+    return User.from_db(
+        DEFAULT_DB_ALIAS,
+        [f.attname for f in fields],
+        [f.to_python(claims[f.attname]) for f in fields],
+    )
+
+
+def load_user_row(user):
+    """Re-read a claims-built user's whole row, in one query.
+
+    Needed before reading non-claim columns in bulk or saving the user:
+    claims may be up to an access-token lifetime old and would otherwise
+    be written back.
+    """
+    if user.get_deferred_fields():
+        user.refresh_from_db(fields=[f.attname for f in user._meta.concrete_fields])
+    return user
+
+
+def access_token_from_refresh(raw_refresh_token):
+    """Validate a refresh token and mint an access token from it.
+
+    With JWT_CLAIMS_AUTH the user row is read so the new token carries
+    current claims; this is where claim changes made elsewhere propagate.
+    """
+    from .tokens import RefreshToken
+
+    refresh = RefreshToken(raw_refresh_token)
+    access_token = refresh.access_token
+    if settings.JWT_CLAIMS_AUTH:
+        user = get_user_model().objects.get(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]})
+        add_user_claims(access_token, user)
+    return access_token
 
 
 class CookieJWTAuthentication(JWTAuthentication):
@@ -25,4 +103,105 @@ class CookieJWTAuthentication(JWTAuthentication):
         validated_token = self.get_validated_token(raw_token)
         return self.get_user(validated_token), validated_token
 
+    def get_user(self, validated_token):
+        """Resolve the token's user from its claims when possible, else query it."""
+        return self.get_claims_user(validated_token) or super().get_user(validated_token)
+
+    def get_claims_user(self, validated_token):
+        user = user_from_claims(validated_token)
+        if user is not None and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        return user
+
+    async def aauthenticate(self, request) -> Optional[Tuple[object, str]]:
+        """Async counterpart of authenticate() for plain Django async views.
+
+        Token validation is CPU-only and runs inline; only the user lookup
+        (skipped for claims-built users) is handed to the ORM thread.
+        """
+        raw_token = None
+        header = self.get_header(request)
+        if header is not None:
+            raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            raw_token = request.COOKIES.get('access_token')
+        if not raw_token:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        user = self.get_claims_user(validated_token)
+        if user is None:
+            user = await sync_to_async(self.get_user)(validated_token)
+        return user, validated_token
+
+
+def async_jwt_required(view_func):
+    """Require JWT authentication on an async Django view.
+
+    Mirrors DRF's IsAuthenticated + CookieJWTAuthentication behaviour: the
+    view gets request.user / request.auth, failures return DRF-style 401s.
+    """
+    authenticator = CookieJWTAuthentication()
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await authenticator.aauthenticate(request)
+        except (AuthenticationFailed, InvalidToken) as e:
+            detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+            response = JsonResponse(detail, status=401)
+            response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return response
+
+        if result is None:
+            response = JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return response
+
+        request.user, request.auth = result
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
+
+
+def reissue_access_token(user, current_token):
+    """Access token with fresh claims for `user`, expiring with `current_token`.
+
+    Used after profile updates when JWT_CLAIMS_AUTH is on, so the claims
+    never lag the row; keeping the old expiry means it never extends a
+    session. Returns None when claims are off (nothing to refresh).
+    """
+    if not settings.JWT_CLAIMS_AUTH or current_token is None:
+        return None
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    access_token = add_user_claims(AccessToken.for_user(user), user)
+    access_token['exp'] = current_token['exp']
+    return access_token
+
+
+def set_auth_cookies(response, access_token, refresh_token=None):
+    """Set the HTTP-only JWT cookies used by the frontend."""
+    response.set_cookie(
+        'access_token',
+        str(access_token),
+        max_age=ACCESS_COOKIE_MAX_AGE,
+        httponly=True,
+        secure=not settings.DEBUG,  # Secure in production
+        samesite='Lax',
+        domain=None,  # Let browser handle domain
+        path='/'
+    )
 
+    if refresh_token is not None:
+        response.set_cookie(
+            'refresh_token',
+            str(refresh_token),
+            max_age=REFRESH_COOKIE_MAX_AGE,
+            httponly=True,
+            secure=not settings.DEBUG,  # Secure in production
+            samesite='Lax',
+            domain=None,  # Let browser handle domain
+            path='/'
+        )
+    return response
@@ -0,0 +1,337 @@
+"""
+Two-tier cache backend: a small per-process L1 in front of Redis (L2).
+
+Reads check the process's L1 first and fall through to Redis; values read
+or written are kept in L1 for a short, jittered TTL so entries cached
+together do not all expire and refetch together. Every write, delete and
+clear is published on a Redis channel, and each process's listener thread
+evicts those keys from its own L1, so workers see each other's writes
+within a pub/sub round trip (and never later than the L1 TTL).
+
+The listener starts on the first cache read or write in a process, so
+management commands that never touch the cache open no subscription. While
+it is not subscribed -- at startup or after Redis drops the connection --
+L1 is bypassed and emptied, since invalidations may have been missed.
+
+publish_stats() copies each cache's L1 size and hit ratios into gauges; the
+metrics endpoint calls it before rendering.
+
+Configure per alias in CACHES:
+
+    'BACKEND': 'core.cache.TwoTierCache',
+    'LOCATION': REDIS_URL,
+    'KEY_PREFIX': 'profile',          # also names the L1 store and metrics
+    'OPTIONS': {'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5, 'L1_JITTER': 0.2},
+
+Remaining OPTIONS are passed to Django's RedisCache.
+"""
+
+import json
+import logging
+import pickle
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import redis
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.redis import RedisCache
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("neora_cache_requests_total", "Two-tier cache lookups by tier and result")
+metrics.describe("neora_cache_invalidations_total", "L1 evictions applied from other processes' broadcasts")
+metrics.describe("neora_cache_l1_entries", "Entries held in this process's L1 per cache")
+metrics.describe("neora_cache_hit_ratio", "Hit ratio per cache and tier since this process started")
+
+INVALIDATE_CHANNEL = "cache:invalidate"
+PROCESS_ID = uuid.uuid4().hex
+
+
+class LocalTier:
+    """Bounded LRU of pickled values with per-entry expiry, shared by a process's threads."""
+
+    def __init__(self, name):
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = {"l1": 0, "l2": 0}
+        self.misses = {"l1": 0, "l2": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            pickled, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return pickled
+
+    def set(self, key, pickled, ttl, max_entries):
+        with self._lock:
+            self._entries[key] = (pickled, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def count(self, tier, hit):
+        counts = self.hits if hit else self.misses
+        with self._lock:
+            counts[tier] += 1
+        metrics.incr("neora_cache_requests_total", cache=self.name, tier=tier, result="hit" if hit else "miss")
+
+    def stats(self):
+        with self._lock:
+            stats = {"entries": len(self._entries)}
+            for tier in ("l1", "l2"):
+                hits, misses = self.hits[tier], self.misses[tier]
+                stats[tier] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+                }
+        return stats
+
+
+class InvalidationListener:
+    """Per-process subscriber that applies other processes' invalidations to L1."""
+
+    def __init__(self, url):
+        self.url = url
+        self.client = redis.from_url(url)
+        self.origin = PROCESS_ID
+        self.tiers = {}
+        self.subscribed = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def register(self, tier):
+        with self._lock:
+            self.tiers[tier.name] = tier
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+                self._thread.start()
+
+    def publish(self, name, keys):
+        """Tell other processes to drop `keys` (None for everything) from their L1."""
+        message = json.dumps({"origin": self.origin, "cache": name, "keys": keys})
+        try:
+            self.client.publish(INVALIDATE_CHANNEL, message)
+        except redis.RedisError as e:
+            # Other processes' L1 may now serve this key for up to L1_TIMEOUT
+            logger.warning(f"Cache invalidation for {name} not published: {e}")
+
+    def _apply(self, data):
+        message = json.loads(data)
+        if message["origin"] == self.origin:
+            return
+        tier = self.tiers.get(message["cache"])
+        if tier is None:
+            return
+        if message["keys"] is None:
+            tier.clear()
+        else:
+            tier.delete(message["keys"])
+        metrics.incr("neora_cache_invalidations_total", cache=tier.name)
+
+    def _clear_all(self):
+        with self._lock:
+            tiers = list(self.tiers.values())
+        for tier in tiers:
+            tier.clear()
+
+    def _run(self):
+        delay = 1
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Entries cached before subscribing may have missed invalidations
+                self._clear_all()
+                self.subscribed.set()
+                delay = 1
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._apply(message["data"])
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener disconnected: {e}")
+            finally:
+                self.subscribed.clear()
+                self._clear_all()
+                pubsub.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+# Module level so every thread's backend instance shares them, like LocMemCache
+_tiers = {}
+_listeners = {}
+_registry_lock = threading.Lock()
+
+
+def _shared(name, url):
+    with _registry_lock:
+        tier = _tiers.setdefault(name, LocalTier(name))
+        listener = _listeners.get(url)
+        if listener is None:
+            listener = _listeners[url] = InvalidationListener(url)
+    listener.register(tier)
+    return tier, listener
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, server, params):
+        super().__init__(params)
+        options = dict(params.get("OPTIONS", {}))
+        self.l1_max_entries = int(options.pop("L1_MAX_ENTRIES", 1000))
+        self.l1_timeout = float(options.pop("L1_TIMEOUT", 5))
+        self.l1_jitter = float(options.pop("L1_JITTER", 0.2))
+        self._l2 = RedisCache(server, {**params, "OPTIONS": options})
+
+        url = server[0] if isinstance(server, (list, tuple)) else re.split("[;,]", server)[0]
+        self._tier, self._listener = _shared(self.key_prefix or "default", url)
+
+    def _l1_ttl(self, timeout=DEFAULT_TIMEOUT):
+        ttl = self.l1_timeout * random.uniform(1 - self.l1_jitter, 1)
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return ttl if timeout is None else min(ttl, timeout)
+
+    def _remember(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if not self._listener.subscribed.is_set():
+            self._listener.start()
+            return
+        ttl = self._l1_ttl(timeout)
+        if ttl > 0:
+            self._tier.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl, self.l1_max_entries)
+
+    def _forget(self, keys):
+        self._tier.delete(keys)
+        self._listener.publish(self._tier.name, keys)
+
+    def get(self, key, default=None, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        pickled = self._tier.get(made_key)
+        if pickled is not None:
+            self._tier.count("l1", True)
+            return pickle.loads(pickled)
+        self._tier.count("l1", False)
+
+        sentinel = object()
+        value = self._l2.get(key, sentinel, version=version)
+        if value is sentinel:
+            self._tier.count("l2", False)
+            return default
+        self._tier.count("l2", True)
+        self._remember(made_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            pickled = self._tier.get(self.make_and_validate_key(key, version=version))
+            self._tier.count("l1", pickled is not None)
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        if missing:
+            fetched = self._l2.get_many(missing, version=version)
+            for key in missing:
+                self._tier.count("l2", key in fetched)
+            for key, value in fetched.items():
+                self._remember(self.make_and_validate_key(key, version=version), value)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        self._l2.set(key, value, timeout, version=version)
+        self._forget([made_key])
+        self._remember(made_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l2.set_many(data, timeout, version=version)
+        made_keys = {self.make_and_validate_key(key, version=version): value for key, value in data.items()}
+        if made_keys:
+            self._forget(list(made_keys))
+            for made_key, value in made_keys.items():
+                self._remember(made_key, value, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._l2.add(key, value, timeout, version=version)
+        if added:
+            self._forget([self.make_and_validate_key(key, version=version)])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # L1 entries already expire before L2 ones; nothing to do locally
+        return self._l2.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        if self._tier.get(self.make_and_validate_key(key, version=version)) is not None:
+            return True
+        return self._l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self._l2.incr(key, delta, version=version)
+        self._forget([self.make_and_validate_key(key, version=version)])
+        return value
+
+    def delete(self, key, version=None):
+        deleted = self._l2.delete(key, version=version)
+        self._forget([self.make_and_validate_key(key, version=version)])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._l2.delete_many(keys, version=version)
+        if keys:
+            self._forget([self.make_and_validate_key(key, version=version) for key in keys])
+
+    def clear(self):
+        # Django's RedisCache.clear() flushes the whole Redis database
+        self._l2.clear()
+        self._tier.clear()
+        self._listener.publish(self._tier.name, None)
+
+    def close(self, **kwargs):
+        self._l2.close(**kwargs)
+
+    def stats(self):
+        """Hit/miss counts and ratios per tier for this process."""
+        return self._tier.stats()
+
+
+def publish_stats():
+    """Export every L1's entry count and hit ratios as gauges."""
+    with _registry_lock:
+        tiers = list(_tiers.values())
+    for tier in tiers:
+        stats = tier.stats()
+        metrics.set_gauge("neora_cache_l1_entries", stats["entries"], cache=tier.name)
+        for name in ("l1", "l2"):
+            if stats[name]["hit_ratio"] is not None:
+                metrics.set_gauge("neora_cache_hit_ratio", stats[name]["hit_ratio"], cache=tier.name, tier=name)
@@ -1,18 +1,127 @@
 from __future__ import annotations
 
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
 import typing as _t
+from collections import OrderedDict
 from urllib.parse import parse_qs
 
+import jwt
 from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
 from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSE_RETRY_LATER = 4429
+
+metrics.describe("neora_ws_connects_admitted_total", "WebSocket handshakes admitted by this process")
+metrics.describe("neora_ws_connects_deferred_total", "WebSocket handshakes deferred with a retry-after hint")
+metrics.describe("neora_ws_admission_tokens", "Handshake tokens currently available in this process")
+
+
+def _token_digest(token_str: str) -> bytes:
+    return hashlib.sha256(token_str.encode("utf-8")).digest()
+
+
+def _user_snapshot(user):
+    """The user's loaded column values, so each hit gets its own instance."""
+    deferred = user.get_deferred_fields()
+    attnames = [f.attname for f in user._meta.concrete_fields if f.attname not in deferred]
+    return type(user), user._state.db, attnames, [getattr(user, name) for name in attnames]
+
+
+def _user_from_snapshot(snapshot):
+    model, db, attnames, values = snapshot
+    return model.from_db(db, attnames, values)
+
+
+class ValidatedTokenCache:
+    """Bounded cache of validated access tokens -> authenticated user snapshot.
+
+    Entries are keyed by the token's ``jti`` and remember a digest of the
+    full token, so a hit skips signature validation and the user query only
+    for the exact token that was validated before. Each entry lives for at
+    most ``ttl`` seconds and never past the token's own ``exp``. Hits return
+    a fresh User built from the snapshot, never an instance another
+    connection holds.
+
+    Only access tokens belong here: refresh tokens can be blacklisted, and
+    a cached one would keep authenticating after logout.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[bytes, _t.Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _unverified_jti(token_str: str) -> str | None:
+        try:
+            return jwt.decode(token_str, options={"verify_signature": False}).get("jti")
+        except jwt.PyJWTError:
+            return None
+
+    def get(self, token_str: str):
+        jti = self._unverified_jti(token_str)
+        if not jti:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is None:
+                return None
+            digest, snapshot, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[jti]
+                return None
+            if not hmac.compare_digest(digest, _token_digest(token_str)):
+                return None
+            self._entries.move_to_end(jti)
+        return _user_from_snapshot(snapshot)
+
+    def set(self, token, token_str: str, user) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        jti = token.get("jti")
+        if not jti:
+            return
+        expires_at = min(time.time() + self.ttl, float(token.get("exp", 0)))
+
+        with self._lock:
+            self._entries[jti] = (_token_digest(token_str), _user_snapshot(user), expires_at)
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = ValidatedTokenCache(
+    max_size=getattr(settings, "WS_AUTH_CACHE_SIZE", 10000),
+    ttl=getattr(settings, "WS_AUTH_CACHE_TTL", 60),
+)
 
 
 @database_sync_to_async
 def _get_user_by_id(user_id: int):
     from django.contrib.auth.models import AnonymousUser
     from django.contrib.auth import get_user_model
-    
+
     UserModel = get_user_model()
     try:
         return UserModel.objects.get(id=user_id)
@@ -20,57 +129,79 @@ def _get_user_by_id(user_id: int):
         return AnonymousUser()
 
 
-@sync_to_async
 def _validate_access_token(token_str: str):
-    """Validate access token and return user_id if valid."""
+    """Validate an access token (signature + expiry, no DB) and return it."""
     from rest_framework_simplejwt.tokens import AccessToken
     from rest_framework_simplejwt.exceptions import TokenError
-    
+
     try:
-        token = AccessToken(token_str)
-        return token.get("user_id")
+        return AccessToken(token_str)
     except TokenError:
         return None
 
 
 @sync_to_async
 def _validate_refresh_token(token_str: str):
-    """Validate refresh token and return new access token user_id if valid."""
-    from rest_framework_simplejwt.tokens import RefreshToken
+    """Validate a refresh token, including the blacklist check, and return it."""
+    from .tokens import RefreshToken
     from rest_framework_simplejwt.exceptions import TokenError
-    
+
     try:
-        refresh_token = RefreshToken(token_str)
-        new_access_token = refresh_token.access_token
-        return new_access_token.get("user_id")
+        return RefreshToken(token_str)
     except TokenError:
         return None
 
 
+async def _authenticate_token(token_str: str, validate, cache: bool = True):
+    """Resolve a raw token to a user, consulting the validated-token cache first.
+
+    Pass cache=False for tokens that must be re-validated on every use
+    (refresh tokens, which the blacklist can revoke).
+    """
+    from django.contrib.auth.models import AnonymousUser
+
+    if cache:
+        user = token_cache.get(token_str)
+        if user is not None:
+            return user
+
+    token = validate(token_str)
+    if hasattr(token, "__await__"):
+        token = await token
+    if token is None:
+        return AnonymousUser()
+
+    from .auth import user_from_claims
+
+    user = user_from_claims(token) or await _get_user_by_id(token.get("user_id"))
+    if user.is_authenticated and user.is_active:
+        if cache:
+            token_cache.set(token, token_str, user)
+        return user
+    return AnonymousUser()
+
+
 class CookieJWTAuthMiddleware(BaseMiddleware):
     """Channels middleware that authenticates via JWT in the access_token cookie.
 
     Falls back to querystring `token` for convenience during local development.
     Also handles refresh_token to automatically get access_token.
+    Validated access tokens are cached (see ValidatedTokenCache), so reconnects
+    with the same token cost neither a signature check nor a user query.
     """
 
     async def __call__(self, scope, receive, send):  # type: ignore[override]
         from django.contrib.auth.models import AnonymousUser
-        import logging
-        
-        logger = logging.getLogger(__name__)
+
         user = AnonymousUser()
 
         try:
-            # Debug logging
-            logger.info(f"WebSocket middleware - scope headers: {dict(scope.get('headers', []))}")
-            logger.info(f"WebSocket middleware - query string: {scope.get('query_string', b'').decode('utf-8')}")
             # 1) Try cookie
             headers = dict(scope.get("headers", []))
             cookie_header = headers.get(b"cookie")
             access_token_str: str | None = None
             refresh_token_str: str | None = None
-            
+
             if cookie_header:
                 cookie_text = cookie_header.decode("latin-1")
                 # simple cookie parse
@@ -89,26 +220,90 @@ class CookieJWTAuthMiddleware(BaseMiddleware):
 
             # 3) Try to use access token
             if access_token_str:
-                user_id = await _validate_access_token(access_token_str)
-                if user_id is not None:
-                    user = await _get_user_by_id(user_id)
-            
+                user = await _authenticate_token(access_token_str, _validate_access_token)
+
             # 4) If no access token but have refresh token, try to refresh
             elif refresh_token_str:
-                logger.info(f"WebSocket middleware - trying refresh token: {refresh_token_str[:20]}...")
-                user_id = await _validate_refresh_token(refresh_token_str)
-                if user_id is not None:
-                    user = await _get_user_by_id(user_id)
-                    logger.info(f"WebSocket middleware - authenticated user: {user.email if hasattr(user, 'email') else 'Unknown'}")
-                    
+                user = await _authenticate_token(refresh_token_str, _validate_refresh_token, cache=False)
+
         except Exception as e:
             # On any failure, remain Anonymous
             logger.error(f"WebSocket middleware - exception: {e}")
-            from django.contrib.auth.models import AnonymousUser
             user = AnonymousUser()
 
-        logger.info(f"WebSocket middleware - final user: {user.email if hasattr(user, 'email') else 'Anonymous'}")
+        logger.debug(f"WebSocket middleware - final user: {user.email if hasattr(user, 'email') else 'Anonymous'}")
         scope["user"] = user
         return await super().__call__(scope, receive, send)
 
 
+class TokenBucket:
+    """Connects-per-second budget for one process."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        # Start of the next free slot handed out to deferred clients
+        self.next_slot = self.updated
+
+    def take(self) -> tuple[bool, float]:
+        """
+        Try to admit one connect.
+
+        Returns:
+            (admitted, seconds until a reserved retry slot when deferred)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+
+        # Give each deferred client its own future slot so a storm is spread
+        # over the time the bucket needs to absorb it
+        slot = max(self.next_slot, now + (1 - self.tokens) / self.rate)
+        self.next_slot = slot + 1 / self.rate
+        return False, slot - now
+
+
+class AdmissionControlMiddleware:
+    """
+    Token-bucket admission control for websocket handshakes.
+
+    Sits outermost so a reconnect storm is shed before any JWT validation,
+    user lookup or group_add. A deferred handshake is accepted only to be
+    closed with 4429; the retry-after hint (seconds, jittered) goes in a JSON
+    frame -- daphne drops close reasons -- and in the close reason for
+    servers that forward it.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.bucket = TokenBucket(settings.WS_ADMISSION_RATE, settings.WS_ADMISSION_BURST)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "websocket" or self.bucket.rate <= 0:
+            return await self.inner(scope, receive, send)
+
+        admitted, wait = self.bucket.take()
+        metrics.set_gauge("neora_ws_admission_tokens", round(self.bucket.tokens, 2))
+        if admitted:
+            metrics.incr("neora_ws_connects_admitted_total")
+            return await self.inner(scope, receive, send)
+
+        metrics.incr("neora_ws_connects_deferred_total")
+        retry_after = min(wait + random.uniform(0, settings.WS_ADMISSION_JITTER), settings.WS_ADMISSION_MAX_RETRY)
+        retry_after = round(retry_after, 1)
+        logger.debug(f"Deferring WebSocket handshake, retry after {retry_after}s")
+
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        await send({"type": "websocket.accept"})
+        await send({
+            "type": "websocket.send",
+            "text": json.dumps({"type": "retry", "code": CLOSE_RETRY_LATER, "retry_after": retry_after}),
+        })
+        await send({"type": "websocket.close", "code": CLOSE_RETRY_LATER, "reason": f"retry-after={retry_after}"})
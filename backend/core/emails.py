@@ -1,15 +1,19 @@
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
 from django.urls import reverse
 import logging
 
+from .outbox import enqueue_email
+
 logger = logging.getLogger(__name__)
 
 
 def send_verification_email(user, token):
     """
-    Send email verification email to the user.
+    Queue the email verification email for the user.
+
+    Delivery happens in the background once the caller's transaction
+    commits (see core/outbox.py).
     
     Args:
         user: User instance
@@ -58,25 +62,18 @@ def send_verification_email(user, token):
         </html>
         """
         
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False
-        )
+        enqueue_email(user.email, subject, message, html_message)
         
-        logger.info(f"Verification email sent to {user.email}")
+        logger.info(f"Verification email queued for {user.email}")
         
     except Exception as e:
-        logger.error(f"Failed to send verification email to {user.email}: {e}")
+        logger.error(f"Failed to queue verification email for {user.email}: {e}")
         raise
 
 
 def send_password_reset_email(user, token):
     """
-    Send password reset email to the user.
+    Queue the password reset email for the user.
     
     Args:
         user: User instance
@@ -129,18 +126,11 @@ def send_password_reset_email(user, token):
         </html>
         """
         
-        send_mail(
-            subject=subject,
-            message=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user.email],
-            html_message=html_message,
-            fail_silently=False
-        )
+        enqueue_email(user.email, subject, message, html_message)
         
-        logger.info(f"Password reset email sent to {user.email}")
+        logger.info(f"Password reset email queued for {user.email}")
         
     except Exception as e:
-        logger.error(f"Failed to send password reset email to {user.email}: {e}")
+        logger.error(f"Failed to queue password reset email for {user.email}: {e}")
         raise
 
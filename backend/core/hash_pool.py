@@ -0,0 +1,107 @@
+"""
+Bounded thread pool for password-hashing work.
+
+Under ASGI every sync view shares one thread, so a burst of logins (each a
+PBKDF2/scrypt run) stalls every other sync request in the process. Views
+wrapped with run_in_hash_pool() run in this pool instead. hashlib releases
+the GIL while hashing, so threads give real parallelism without the
+pickling constraints of a process pool.
+
+At most PASSWORD_HASH_WORKERS jobs run and PASSWORD_HASH_QUEUE wait; beyond
+that callers get a 503 with Retry-After rather than an ever-growing queue.
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+
+from . import metrics
+
+metrics.describe("neora_password_hash_jobs_total", "Jobs run in the password hashing pool")
+metrics.describe("neora_password_hash_rejected_total", "Jobs refused because the hashing pool queue was full")
+metrics.describe("neora_password_hash_queue_seconds_total", "Time jobs spent waiting for a hashing worker")
+metrics.describe("neora_password_hash_run_seconds_total", "Time jobs spent running in the hashing pool")
+metrics.describe("neora_password_hash_pending", "Jobs queued or running in the hashing pool")
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_pending = 0
+
+
+class HashPoolFull(Exception):
+    pass
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            workers = max(settings.PASSWORD_HASH_WORKERS, 1)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+            _slots = threading.BoundedSemaphore(workers + max(settings.PASSWORD_HASH_QUEUE, 0))
+        return _executor, _slots
+
+
+def _adjust_pending(delta):
+    global _pending
+    with _lock:
+        _pending += delta
+        metrics.set_gauge("neora_password_hash_pending", _pending)
+
+
+async def run_in_hash_pool(func, *args, op="other", **kwargs):
+    """
+    Run a sync callable in the hashing pool and await its result.
+
+    Raises:
+        HashPoolFull: if the pool already has its maximum of queued jobs
+    """
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        metrics.incr("neora_password_hash_rejected_total", op=op)
+        raise HashPoolFull()
+
+    queued_at = time.perf_counter()
+    _adjust_pending(1)
+
+    def job():
+        started = time.perf_counter()
+        metrics.incr("neora_password_hash_queue_seconds_total", started - queued_at, op=op)
+        # Pool threads outlive requests, so apply CONN_MAX_AGE like a request would
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+            metrics.incr("neora_password_hash_run_seconds_total", time.perf_counter() - started, op=op)
+            metrics.incr("neora_password_hash_jobs_total", op=op)
+            _adjust_pending(-1)
+            # Released here, not by the caller: a cancelled request still occupies its slot
+            slots.release()
+
+    # Same context propagation as sync_to_async (e.g. the read-replica pin)
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, job))
+
+
+def hash_pool_view(view_func, op):
+    """Serve a sync view from the hashing pool as an async view."""
+
+    @functools.wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await run_in_hash_pool(view_func, request, *args, op=op, **kwargs)
+        except HashPoolFull:
+            response = JsonResponse({'error': 'Server is busy. Please try again shortly.'}, status=503)
+            response['Retry-After'] = '1'
+            return response
+
+    return wrapper
@@ -0,0 +1,32 @@
+"""
+Password hashers with their cost taken from settings.
+
+Django re-hashes a password on the next successful login whenever the
+stored hash was made with different parameters (or by another hasher in
+PASSWORD_HASHERS), so changing PASSWORD_PBKDF2_ITERATIONS,
+PASSWORD_SCRYPT_WORK_FACTOR or PASSWORD_HASHER migrates users gradually.
+"""
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with PASSWORD_PBKDF2_ITERATIONS iterations."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """scrypt with N = PASSWORD_SCRYPT_WORK_FACTOR."""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def maxmem(self):
+        # scrypt needs ~128 * N * r bytes; OpenSSL's default cap is 32 MiB
+        return 2 * 128 * self.work_factor * self.block_size
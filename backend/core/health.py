@@ -0,0 +1,156 @@
+"""
+Background dependency checks behind the health endpoints.
+
+A daemon thread checks the database (and replica lag), Redis, the channel
+layer and n8n every HEALTH_PROBE_INTERVAL seconds and keeps the latest
+result of each with its timestamp. /ready, /api/health and the dependency
+gauges only read those results, so a probe is constant-time and a burst of
+probes never reaches the dependencies.
+
+The prober starts with the ASGI application (or on the first probe when
+served some other way). Until every check has run once, and whenever the
+results go stale because the prober is stuck, the instance is not ready.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+from channels import DEFAULT_CHANNEL_LAYER
+from channels.layers import channel_layers
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from neora.db_router import replica_status
+from . import metrics
+from .redis_client import get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("neora_dependency_up", "Whether the last background check of a dependency passed")
+metrics.describe("neora_dependency_check_seconds", "Duration of the last background check of a dependency")
+
+
+def check_database():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+    replicas = replica_status()
+    return {"replicas": replicas} if replicas else {}
+
+
+def check_redis():
+    if not redis_enabled():
+        return {"detail": "disabled"}
+    get_redis().ping()
+    return {}
+
+
+async def _channel_layer_round_trip(layer):
+    channel = await layer.new_channel()
+    await layer.send(channel, {"type": "health.probe"})
+    await asyncio.wait_for(layer.receive(channel), settings.HEALTH_PROBE_TIMEOUT)
+
+
+def n8n_health_url():
+    parts = urlsplit(settings.N8N_WEBHOOK_URL)
+    return f"{parts.scheme}://{parts.netloc}/healthz" if parts.netloc else None
+
+
+class Prober:
+    """Runs every check on an interval and keeps the latest results."""
+
+    def __init__(self):
+        self.results = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop = None
+        self._http = None
+        self._layer = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+                self._thread.start()
+
+    def checks(self):
+        return {
+            "database": check_database,
+            "redis": check_redis,
+            # One loop for the thread's lifetime so the layer can reuse its connections
+            "channel_layer": lambda: (
+                self._loop.run_until_complete(_channel_layer_round_trip(self._layer)) or {}
+            ),
+            "n8n": self.check_n8n,
+        }
+
+    def check_n8n(self):
+        url = n8n_health_url()
+        if url is None:
+            return {"detail": "not configured"}
+        response = self._http.get(url)
+        if response.status_code >= 500:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return {"detail": f"HTTP {response.status_code}"}
+
+    def run_checks(self):
+        for name, check in self.checks().items():
+            started = time.perf_counter()
+            try:
+                result = {"status": "ok", **check()}
+            except Exception as e:
+                result = {"status": "error", "detail": str(e)}
+            elapsed = time.perf_counter() - started
+            result["checked_at"] = timezone.now().isoformat()
+            result["latency_ms"] = round(elapsed * 1000, 1)
+            metrics.set_gauge("neora_dependency_up", int(result["status"] == "ok"), dependency=name)
+            metrics.set_gauge("neora_dependency_check_seconds", elapsed, dependency=name)
+            with self._lock:
+                self.results[name] = (time.monotonic(), result)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        self._http = httpx.Client(timeout=settings.HEALTH_PROBE_TIMEOUT)
+        # Our own layer instance: channels_redis lets only one event loop
+        # receive() on an instance, and the server's loop owns the shared one
+        self._layer = channel_layers.make_backend(DEFAULT_CHANNEL_LAYER)
+        while True:
+            close_old_connections()
+            try:
+                self.run_checks()
+            except Exception as e:
+                logger.error(f"Health prober error: {e}")
+            finally:
+                close_old_connections()
+            time.sleep(settings.HEALTH_PROBE_INTERVAL)
+
+    def snapshot(self):
+        """Latest result per dependency, with its age; a result too old reads as stale."""
+        now = time.monotonic()
+        with self._lock:
+            results = dict(self.results)
+        snapshot = {}
+        for name, (checked, result) in results.items():
+            age = now - checked
+            result = dict(result, age_seconds=round(age, 1))
+            if age > settings.HEALTH_STALE_AFTER:
+                result["status"] = "stale"
+            snapshot[name] = result
+        return snapshot
+
+
+prober = Prober()
+
+
+def readiness():
+    """(ready, checks) from the cached results; only HEALTH_READY_CHECKS gate readiness."""
+    prober.start()
+    checks = prober.snapshot()
+    ready = all(
+        checks.get(name, {}).get("status") == "ok" for name in settings.HEALTH_READY_CHECKS
+    )
+    return ready, checks
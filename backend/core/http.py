@@ -0,0 +1,10 @@
+"""Request helpers shared by the async (non-DRF) views."""
+
+import json
+
+
+def request_data(request):
+    """Parse a JSON or form-encoded body the way DRF's default parsers would."""
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST.dict()
@@ -0,0 +1,218 @@
+"""
+Brute-force lockout for login, tracked in Redis instead of the database.
+
+Failed logins are kept as sliding windows, one per email and one per client
+IP: a sorted set of failure timestamps trimmed to the last
+LOGIN_LOCKOUT_WINDOW seconds. Once either window holds its limit, further
+attempts are refused until the oldest counted failure ages out. The check
+runs before the login view reaches the hashing pool, so a refused attempt
+costs one Redis round trip rather than a password hash and database writes.
+
+Failures are recorded from Django's user_login_failed signal, which
+authenticate() sends after every backend rejects the credentials. Without
+Redis the windows live in process memory (per worker).
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+from .http import request_data
+from .redis_client import get_async_redis, get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("neora_login_failures_total", "Failed login attempts recorded by the lockout")
+metrics.describe("neora_login_lockout_rejected_total", "Login attempts refused because the email or IP is locked out")
+
+KEY_PREFIX = "lockout"
+
+# KEYS: failure windows; ARGV: now, window, then one limit per key
+# Returns seconds until every key is under its limit ("0" when none is locked)
+CHECK_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i + 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    local count = redis.call('ZCARD', key)
+    if count >= limit then
+        local oldest = redis.call('ZRANGE', key, count - limit, count - limit, 'WITHSCORES')
+        wait = math.max(wait, tonumber(oldest[2]) + window - now)
+    end
+end
+return tostring(wait)
+"""
+
+# KEYS: failure windows; ARGV: now, window, member, then one limit per key
+# Returns the failure count in each window
+RECORD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local counts = {}
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[i + 3])
+    redis.call('ZADD', key, now, ARGV[3])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    -- Only the newest `limit` failures matter for the lockout
+    redis.call('ZREMRANGEBYRANK', key, 0, -limit - 1)
+    redis.call('EXPIRE', key, window)
+    counts[i] = redis.call('ZCARD', key)
+end
+return counts
+"""
+
+
+class LocalWindows:
+    """In-process failure windows for when Redis is unavailable (bounded, LRU)."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _window(self, key, limit, now, window):
+        failures = self._windows.pop(key, None) or deque(maxlen=limit)
+        while failures and failures[0] <= now - window:
+            failures.popleft()
+        self._windows[key] = failures
+        while len(self._windows) > self.max_size:
+            self._windows.popitem(last=False)
+        return failures
+
+    def check(self, limits, window):
+        now = time.time()
+        wait = 0.0
+        with self._lock:
+            for key, limit in limits:
+                failures = self._window(key, limit, now, window)
+                if len(failures) >= limit:
+                    wait = max(wait, failures[-limit] + window - now)
+        return wait
+
+    def record(self, limits, window):
+        now = time.time()
+        with self._lock:
+            counts = []
+            for key, limit in limits:
+                failures = self._window(key, limit, now, window)
+                failures.append(now)
+                counts.append(len(failures))
+        return counts
+
+    def clear(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+local_windows = LocalWindows()
+
+
+def email_key(email):
+    # Hashed so Redis never holds the addresses being attacked
+    digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+    return f"{KEY_PREFIX}:email:{digest}"
+
+
+def ip_key(ip):
+    return f"{KEY_PREFIX}:ip:{ip}"
+
+
+def _limits(email, ip):
+    limits = [(ip_key(ip), settings.LOGIN_LOCKOUT_IP_LIMIT)]
+    if email:
+        limits.append((email_key(email), settings.LOGIN_LOCKOUT_EMAIL_LIMIT))
+    return limits
+
+
+async def locked_for(email, ip):
+    """Seconds until this email/IP may try again; 0 when not locked out."""
+    limits = _limits(email, ip)
+    window = settings.LOGIN_LOCKOUT_WINDOW
+    if redis_enabled():
+        try:
+            keys = [key for key, _ in limits]
+            wait = await get_async_redis().eval(
+                CHECK_SCRIPT, len(keys), *keys, time.time(), window, *(limit for _, limit in limits)
+            )
+            return float(wait)
+        except redis.RedisError as e:
+            logger.warning(f"Lockout check falling back to local windows: {e}")
+    return local_windows.check(limits, window)
+
+
+def record_failure(email, ip):
+    """Count a failed login against both the email and the IP."""
+    limits = _limits(email, ip)
+    window = settings.LOGIN_LOCKOUT_WINDOW
+    metrics.incr("neora_login_failures_total")
+    counts = None
+    if redis_enabled():
+        try:
+            keys = [key for key, _ in limits]
+            counts = get_redis().eval(
+                RECORD_SCRIPT, len(keys), *keys, time.time(), window, uuid.uuid4().hex,
+                *(limit for _, limit in limits)
+            )
+        except redis.RedisError as e:
+            logger.warning(f"Lockout record falling back to local windows: {e}")
+    if counts is None:
+        counts = local_windows.record(limits, window)
+
+    for (key, limit), count in zip(limits, counts):
+        if count == limit:
+            logger.warning(f"Login locked out for {key} after {count} failures")
+
+
+def clear(email):
+    """Forget an email's failures after it logs in or resets its password."""
+    key = email_key(email)
+    local_windows.clear(key)
+    if redis_enabled():
+        try:
+            get_redis().delete(key)
+        except redis.RedisError as e:
+            logger.warning(f"Could not clear lockout for {key}: {e}")
+
+
+def on_login_failed(sender, credentials, request=None, **kwargs):
+    """user_login_failed receiver."""
+    if request is None:
+        return
+    record_failure(credentials.get("username") or credentials.get("email"), BaseThrottle().get_ident(request))
+
+
+def lockout_view(view_func):
+    """Refuse a login view's requests while the email or IP is locked out."""
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            email = request_data(request).get("email")
+        except ValueError:
+            # Let the view report the malformed body
+            email = None
+        wait = await locked_for(email if isinstance(email, str) else None, BaseThrottle().get_ident(request))
+        if wait > 0:
+            metrics.incr("neora_login_lockout_rejected_total")
+            seconds = max(math.ceil(wait), 1)
+            response = JsonResponse({
+                'error': f'Too many failed login attempts. Try again in {seconds} seconds.'
+            }, status=429)
+            response['Retry-After'] = str(seconds)
+            return response
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,41 @@
+import redis
+from django.core.management.base import BaseCommand, CommandError
+
+from core import token_blacklist
+from core.redis_client import redis_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired outstanding/blacklisted refresh tokens in batches and keep the "
+        "Redis blacklist mirror pruned and in sync. Meant to run on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Tokens deleted per transaction")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be deleted")
+        parser.add_argument("--rebuild-cache", action="store_true",
+                            help="Rebuild the Redis mirror even if it is already in sync")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        outstanding, blacklisted = token_blacklist.prune_database(
+            batch_size=options["batch_size"], pause=options["pause"], dry_run=options["dry_run"]
+        )
+        verb = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(f"{verb} {outstanding} expired outstanding tokens ({blacklisted} blacklisted)")
+
+        if options["dry_run"] or not redis_enabled():
+            return
+
+        try:
+            removed = token_blacklist.prune_cache()
+            self.stdout.write(f"Dropped {removed} expired entries from the Redis mirror")
+            if options["rebuild_cache"] or not token_blacklist.is_synced():
+                mirrored = token_blacklist.rebuild()
+                self.stdout.write(f"Rebuilt the Redis mirror with {mirrored} blacklisted tokens")
+        except redis.RedisError as e:
+            raise CommandError(f"Redis mirror not updated: {e}")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core.outbox import EmailSender
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued emails from the outbox. Runs until interrupted; use it as a dedicated "
+        "worker when EMAIL_OUTBOX_IN_PROCESS is false."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true",
+                            help="Send everything currently due, then exit")
+
+    def handle(self, *args, **options):
+        sender = EmailSender()
+
+        if options["once"]:
+            total = 0
+            try:
+                while claimed := sender.run_once():
+                    total += claimed
+            finally:
+                sender.close_connection()
+            self.stdout.write(f"Processed {total} queued emails")
+            return
+
+        self.stdout.write("Sending queued emails (Ctrl-C to stop)")
+        try:
+            sender.run()
+        except KeyboardInterrupt:
+            sender.close_connection()
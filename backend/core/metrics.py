@@ -0,0 +1,72 @@
+"""
+In-process metrics exported in the Prometheus text format.
+
+Counters and gauges live in this process only; with several daphne
+processes each one is scraped (or summed) separately via /api/metrics/.
+"""
+
+import threading
+from collections import defaultdict
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_help = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name, text):
+    _help[name] = text
+
+
+def incr(name, value=1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def remove_gauge(name, **labels):
+    with _lock:
+        _gauges.pop(_key(name, labels), None)
+
+
+def snapshot():
+    """Current values as {"counters": {...}, "gauges": {...}} keyed by name{labels}."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    return {
+        "counters": {_format_series(name, labels): value for (name, labels), value in counters.items()},
+        "gauges": {_format_series(name, labels): value for (name, labels), value in gauges.items()},
+    }
+
+
+def _format_series(name, labels):
+    if not labels:
+        return name
+    inner = ",".join(f'{key}="{str(value)}"' for key, value in labels)
+    return f"{name}{{{inner}}}"
+
+
+def render_prometheus():
+    with _lock:
+        series = [(name, labels, value, "counter") for (name, labels), value in _counters.items()]
+        series += [(name, labels, value, "gauge") for (name, labels), value in _gauges.items()]
+
+    lines = []
+    seen = set()
+    for name, labels, value, kind in sorted(series, key=lambda s: (s[0], s[1])):
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{_format_series(name, labels)} {value:g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,186 @@
+"""
+Database-backed email outbox and its background sender.
+
+enqueue_email() writes an OutboundEmail row in the caller's transaction and
+wakes the sender once that transaction commits, so requests never wait on
+SMTP and rolled-back work never sends mail. The sender claims due rows in
+batches, sends them over one SMTP connection that it keeps open between
+batches, and retries failures with exponential backoff.
+
+By default every web process runs a sender thread, started with the ASGI
+application (or on first use when served some other way), so mail queued
+or left to retry before a restart goes out without waiting for new mail.
+With EMAIL_OUTBOX_IN_PROCESS=false, run `manage.py run_email_outbox` as a
+dedicated worker instead. Several senders can run at once: claiming a row
+leases it, so only one of them sends it.
+"""
+
+import logging
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+# How long a claimed row stays invisible to other senders; a sender that
+# dies mid-batch leaves its rows to be retried after this
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def enqueue_email(to, subject, body, html_body=""):
+    """Queue an email; it is handed to the sender after the current transaction commits."""
+    email = OutboundEmail.objects.create(to=to, subject=subject, body=body, html_body=html_body)
+    if settings.EMAIL_OUTBOX_IN_PROCESS:
+        transaction.on_commit(wake_sender)
+    return email
+
+
+def retry_delay(attempts):
+    """Backoff before attempt `attempts + 1`: doubling from EMAIL_OUTBOX_RETRY_BASE, with jitter."""
+    delay = min(settings.EMAIL_OUTBOX_RETRY_BASE * 2 ** (attempts - 1), settings.EMAIL_OUTBOX_RETRY_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size):
+    """Lease up to `batch_size` due emails to this sender."""
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="queued", next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        for email in batch:
+            email.attempts += 1
+            email.next_attempt_at = now + CLAIM_LEASE
+        OutboundEmail.objects.bulk_update(batch, ["attempts", "next_attempt_at"])
+    return batch
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email.to],
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+class EmailSender:
+    """Sends queued emails over a persistent SMTP connection."""
+
+    def __init__(self):
+        self.connection = None
+        self.idle_since = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def open_connection(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        return self.connection
+
+    def close_connection(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing SMTP connection: {e}")
+            self.connection = None
+
+    def send_one(self, email):
+        try:
+            build_message(email, self.open_connection()).send()
+        except Exception as e:
+            # The connection may be what failed; reconnect for the next email
+            self.close_connection()
+            if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                email.status = "failed"
+                logger.error(f"Giving up on email {email.id} to {email.to} after {email.attempts} attempts: {e}")
+            else:
+                email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                logger.warning(f"Email {email.id} to {email.to} failed (attempt {email.attempts}), retrying: {e}")
+            email.last_error = str(e)
+            email.save(update_fields=["status", "next_attempt_at", "last_error"])
+            return False
+
+        email.status = "sent"
+        email.sent_at = timezone.now()
+        email.last_error = ""
+        email.save(update_fields=["status", "sent_at", "last_error"])
+        logger.info(f"Sent email {email.id} to {email.to}")
+        return True
+
+    def run_once(self):
+        """Send one batch of due emails; returns how many were claimed."""
+        batch = claim_batch(settings.EMAIL_OUTBOX_BATCH_SIZE)
+        for email in batch:
+            self.send_one(email)
+        return len(batch)
+
+    def run(self):
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                logger.error(f"Email outbox sender error: {e}")
+                claimed = 0
+
+            if claimed:
+                self.idle_since = None
+                continue
+
+            now = timezone.now()
+            self.idle_since = self.idle_since or now
+            if (now - self.idle_since).total_seconds() >= settings.EMAIL_OUTBOX_IDLE_DISCONNECT:
+                self.close_connection()
+
+            # Woken early by new mail; the timeout picks up retries coming due
+            self._wake.wait(settings.EMAIL_OUTBOX_POLL_INTERVAL)
+            self._wake.clear()
+
+        self.close_connection()
+        connections.close_all()
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def start_sender():
+    """Start this process's sender thread unless a dedicated worker sends mail."""
+    global _sender
+    if not settings.EMAIL_OUTBOX_IN_PROCESS:
+        return None
+    with _sender_lock:
+        if _sender is None:
+            _sender = EmailSender()
+            threading.Thread(target=_sender.run, name="email-outbox", daemon=True).start()
+    return _sender
+
+
+def wake_sender():
+    """Start this process's sender thread if needed and nudge it."""
+    sender = start_sender()
+    if sender is not None:
+        sender.wake()
@@ -0,0 +1,42 @@
+"""
+Shared Redis connections.
+
+REDIS_URL doubles as the switch for Redis-backed features: when it is not a
+redis:// URL (e.g. ``memory://`` in local development) callers fall back to
+an in-process implementation, the same way CHANNEL_LAYERS does.
+"""
+
+import asyncio
+import weakref
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+_sync_client = None
+
+# redis.asyncio connections are bound to the loop that opened them, so keep
+# one client per event loop (daphne's loop plus any async_to_sync loops).
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def redis_enabled():
+    return settings.REDIS_URL.startswith(('redis://', 'rediss://'))
+
+
+def get_redis():
+    """Process-wide sync Redis client."""
+    global _sync_client
+    if _sync_client is None:
+        _sync_client = redis.from_url(settings.REDIS_URL)
+    return _sync_client
+
+
+def get_async_redis():
+    """Async Redis client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = aioredis.from_url(settings.REDIS_URL)
+        _async_clients[loop] = client
+    return client
@@ -1,3 +1,112 @@
-from django.test import TestCase
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from django.utils.functional import SimpleLazyObject
+
+from . import lockout
+from .throttling import client_ident, local_buckets, take, throttle, throttled_response
+
+
+def _session_user():
+    raise AssertionError("the lazy session user was evaluated")
+
+
+@override_settings(REDIS_URL='memory://', THROTTLE_ENABLED=True, THROTTLE_RATES={'test': '2/min'})
+class ThrottleTests(SimpleTestCase):
+    def setUp(self):
+        local_buckets._buckets.clear()
+
+    def test_bucket_refuses_once_its_burst_is_spent(self):
+        self.assertEqual(take('test', 'ip:a'), (True, 0.0))
+        self.assertEqual(take('test', 'ip:a'), (True, 0.0))
+        allowed, wait = take('test', 'ip:a')
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 30, delta=0.1)
+        # Buckets are per client
+        self.assertEqual(take('test', 'ip:b'), (True, 0.0))
+
+    def test_unknown_scope_is_not_throttled(self):
+        for _ in range(5):
+            self.assertEqual(take('other', 'ip:a'), (True, 0.0))
+
+    async def test_throttled_view_returns_drf_shaped_429(self):
+        @throttle('test')
+        async def view(request):
+            return JsonResponse({'ok': True})
+
+        request = AsyncRequestFactory().get('/')
+        for _ in range(2):
+            self.assertEqual((await view(request)).status_code, 200)
+        response = await view(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(
+            json.loads(response.content),
+            {'detail': 'Request was throttled. Expected available in 30 seconds.'},
+        )
+
+    def test_retry_after_is_at_least_one_second(self):
+        self.assertEqual(throttled_response(0.2)['Retry-After'], '1')
+
+    async def test_async_view_never_evaluates_the_session_user(self):
+        @throttle('test')
+        async def view(request):
+            return JsonResponse({'ok': True})
+
+        request = AsyncRequestFactory().get('/')
+        request.user = SimpleLazyObject(_session_user)
+
+        self.assertEqual(client_ident(request), 'ip:127.0.0.1')
+        self.assertEqual((await view(request)).status_code, 200)
+
+
+@override_settings(
+    REDIS_URL='memory://', LOGIN_LOCKOUT_WINDOW=60, LOGIN_LOCKOUT_EMAIL_LIMIT=2, LOGIN_LOCKOUT_IP_LIMIT=3,
+)
+class LockoutTests(SimpleTestCase):
+    def setUp(self):
+        lockout.local_windows._windows.clear()
+
+    async def test_email_is_locked_until_its_oldest_failure_ages_out(self):
+        now = time.time()
+        with mock.patch.object(lockout, 'time', mock.Mock(time=lambda: now)):
+            lockout.record_failure('a@example.com', '10.0.0.1')
+            lockout.record_failure('A@example.com ', '10.0.0.2')
+            self.assertAlmostEqual(await lockout.locked_for('a@example.com', '10.0.0.3'), 60)
+            self.assertEqual(await lockout.locked_for('b@example.com', '10.0.0.3'), 0)
+
+        with mock.patch.object(lockout, 'time', mock.Mock(time=lambda: now + 61)):
+            self.assertEqual(await lockout.locked_for('a@example.com', '10.0.0.3'), 0)
+
+    async def test_ip_is_locked_across_emails(self):
+        for i in range(3):
+            lockout.record_failure(f'user{i}@example.com', '10.0.0.1')
+        self.assertGreater(await lockout.locked_for('new@example.com', '10.0.0.1'), 0)
+        self.assertEqual(await lockout.locked_for('new@example.com', '10.0.0.2'), 0)
+
+    async def test_clear_forgets_the_email_window(self):
+        lockout.record_failure('a@example.com', '10.0.0.1')
+        lockout.record_failure('a@example.com', '10.0.0.1')
+        lockout.clear('a@example.com')
+        self.assertEqual(await lockout.locked_for('a@example.com', '10.0.0.1'), 0)
+
+    async def test_locked_out_login_gets_429_with_retry_after(self):
+        @lockout.lockout_view
+        async def view(request):
+            return JsonResponse({'ok': True})
+
+        def login():
+            return AsyncRequestFactory().post(
+                '/', data={'email': 'a@example.com'}, content_type='application/json',
+            )
+
+        self.assertEqual((await view(login())).status_code, 200)
+        lockout.record_failure('a@example.com', '10.0.0.9')
+        lockout.record_failure('a@example.com', '10.0.0.9')
+        response = await view(login())
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertIn('Try again in 60 seconds', json.loads(response.content)['error'])
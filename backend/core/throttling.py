@@ -0,0 +1,206 @@
+"""
+Token-bucket rate limiting shared across workers through Redis.
+
+Each (scope, client) pair gets a bucket holding up to N tokens that refills
+at N per period, for a THROTTLE_RATES entry "N/period". The refill-and-take
+step is one Lua script, so concurrent workers never double-spend a token.
+When Redis is not configured or unreachable, buckets fall back to this
+process's memory: limits then apply per worker instead of globally, which
+is looser but keeps the endpoints protected.
+
+Used through TokenBucketThrottle subclasses on DRF views, the throttle()
+decorator on async views, and directly by the websocket chat turn.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+from .redis_client import get_async_redis, get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("neora_throttled_requests_total", "Requests refused by the token-bucket throttle")
+metrics.describe("neora_throttle_local_fallback_total", "Throttle checks served from process memory because Redis failed")
+
+KEY_PREFIX = "throttle"
+
+# KEYS[1] bucket; ARGV: refill rate (tokens/s), capacity, now (s)
+# Returns {allowed, seconds until a token is available}
+TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity 10, refill 10/60 tokens per second)."""
+    count, period = rate.split("/")
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip()[0]]
+
+
+class LocalBuckets:
+    """In-process buckets for when Redis is unavailable (bounded, LRU)."""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - ts) * rate)
+            if tokens >= 1:
+                result = (True, 0.0)
+                tokens -= 1
+            else:
+                result = (False, (1 - tokens) / rate)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_size:
+                self._buckets.popitem(last=False)
+        return result
+
+
+local_buckets = LocalBuckets()
+
+
+def _bucket(scope, ident):
+    rate = settings.THROTTLE_RATES.get(scope)
+    if not settings.THROTTLE_ENABLED or not rate:
+        return None
+    capacity, refill = parse_rate(rate)
+    return f"{KEY_PREFIX}:{scope}:{ident}", capacity, refill
+
+
+def _result(scope, allowed, wait):
+    if not allowed:
+        metrics.incr("neora_throttled_requests_total", scope=scope)
+    return bool(allowed), round(float(wait), 2)
+
+
+def take(scope, ident):
+    """
+    Take a token from the client's bucket for `scope`.
+
+    Returns:
+        (allowed, seconds to wait before retrying)
+    """
+    bucket = _bucket(scope, ident)
+    if bucket is None:
+        return True, 0.0
+    key, capacity, refill = bucket
+    if redis_enabled():
+        try:
+            allowed, wait = get_redis().eval(TAKE_SCRIPT, 1, key, refill, capacity, time.time())
+            return _result(scope, allowed, wait)
+        except redis.RedisError as e:
+            logger.warning(f"Throttle falling back to local buckets: {e}")
+            metrics.incr("neora_throttle_local_fallback_total")
+    return _result(scope, *local_buckets.take(key, capacity, refill))
+
+
+async def atake(scope, ident):
+    """Async counterpart of take()."""
+    bucket = _bucket(scope, ident)
+    if bucket is None:
+        return True, 0.0
+    key, capacity, refill = bucket
+    if redis_enabled():
+        try:
+            allowed, wait = await get_async_redis().eval(TAKE_SCRIPT, 1, key, refill, capacity, time.time())
+            return _result(scope, allowed, wait)
+        except redis.RedisError as e:
+            logger.warning(f"Throttle falling back to local buckets: {e}")
+            metrics.incr("neora_throttle_local_fallback_total")
+    return _result(scope, *local_buckets.take(key, capacity, refill))
+
+
+def client_ident(request):
+    """
+    User id when authenticated, else the client IP (honours REST_FRAMEWORK
+    NUM_PROXIES). Only a user set by DRF or async_jwt_required counts: the
+    session user AuthenticationMiddleware leaves on the request is lazy, and
+    evaluating it inside an async view raises SynchronousOnlyOperation.
+    """
+    user = getattr(request, "user", None)
+    if user is not None and not isinstance(user, SimpleLazyObject) and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def throttled_response(wait):
+    """429 shaped like DRF's Throttled response."""
+    seconds = max(math.ceil(wait), 1)
+    response = JsonResponse({"detail": f"Request was throttled. Expected available in {seconds} seconds."}, status=429)
+    response["Retry-After"] = str(seconds)
+    return response
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle backed by take(); subclasses set `scope`."""
+
+    scope = None
+
+    def allow_request(self, request, view):
+        allowed, self._wait = take(self.scope, client_ident(request))
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class ForgotPasswordThrottle(TokenBucketThrottle):
+    scope = "forgot_password"
+
+
+def throttle(scope):
+    """
+    Throttle an async view. Apply it inside async_jwt_required so the
+    bucket is per user rather than per IP.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            allowed, wait = await atake(scope, client_ident(request))
+            if not allowed:
+                return throttled_response(wait)
+            return await view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
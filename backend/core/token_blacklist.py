@@ -0,0 +1,189 @@
+"""
+Redis mirror of the refresh-token blacklist, plus batched pruning.
+
+simplejwt checks every refresh token against BlacklistedToken with a join on
+OutstandingToken, and neither table is ever pruned. The blacklisted jtis of
+unexpired tokens are mirrored into one sorted set (score = token expiry), so
+the check is a single ZMSCORE. The set carries a sentinel member once it has
+been rebuilt from the database; without it (fresh Redis, eviction, failed
+write) lookups answer "unknown" and callers fall back to the tables, and the
+first such lookup starts a rebuild on a background thread. One process
+rebuilds at a time; the nightly prune_token_blacklist run rebuilds too.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+import redis
+from django.db import close_old_connections, transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from .redis_client import get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+BLACKLIST_KEY = "jwt:blacklist"
+SYNCED_MEMBER = "__synced__"
+REBUILD_LOCK_KEY = f"{BLACKLIST_KEY}:rebuilding"
+REBUILD_LOCK_SECONDS = 300
+# A process retries an untrusted mirror's rebuild at most this often
+REBUILD_RETRY_SECONDS = 60
+
+_rebuild_lock = threading.Lock()
+_next_rebuild = 0
+
+
+def is_blacklisted(jti):
+    """
+    Look a jti up in the mirror.
+
+    Returns:
+        True/False, or None when the mirror is unavailable or not yet built
+    """
+    if not redis_enabled():
+        return None
+    try:
+        score, synced = get_redis().zmscore(BLACKLIST_KEY, [jti, SYNCED_MEMBER])
+    except redis.RedisError as e:
+        logger.warning(f"Token blacklist cache unavailable, checking the database: {e}")
+        return None
+    if synced is None:
+        rebuild_in_background()
+        return None
+    return score is not None
+
+
+def rebuild_in_background():
+    """Start a rebuild thread, unless this process started one recently."""
+    global _next_rebuild
+    now = time.monotonic()
+    with _rebuild_lock:
+        if now < _next_rebuild:
+            return
+        _next_rebuild = now + REBUILD_RETRY_SECONDS
+    threading.Thread(target=_run_rebuild, name="token-blacklist-rebuild", daemon=True).start()
+
+
+def _run_rebuild():
+    client = get_redis()
+    close_old_connections()
+    try:
+        if not client.set(REBUILD_LOCK_KEY, 1, nx=True, ex=REBUILD_LOCK_SECONDS):
+            return  # another process is rebuilding
+        try:
+            count = rebuild()
+            logger.info(f"Rebuilt the token blacklist mirror with {count} tokens")
+        finally:
+            client.delete(REBUILD_LOCK_KEY)
+    except Exception as e:
+        logger.error(f"Could not rebuild the token blacklist mirror: {e}")
+    finally:
+        close_old_connections()
+
+
+def add(jti, expires_at):
+    """Mirror a newly blacklisted token (and drop entries that have expired)."""
+    if not redis_enabled():
+        return
+    client = get_redis()
+    try:
+        pipe = client.pipeline()
+        pipe.zadd(BLACKLIST_KEY, {jti: expires_at.timestamp()})
+        pipe.zremrangebyscore(BLACKLIST_KEY, "-inf", time.time())
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.error(f"Could not mirror blacklisted token {jti}: {e}")
+        try:
+            # A set that misses a blacklisted jti must not be trusted
+            client.zrem(BLACKLIST_KEY, SYNCED_MEMBER)
+        except redis.RedisError:
+            pass
+
+
+def on_token_blacklisted(sender, instance, created, **kwargs):
+    """post_save receiver for BlacklistedToken (logout, rotation, admin)."""
+    if created:
+        # Not deferred to on_commit: a rolled-back logout leaves a false
+        # positive, which is safer than a window where the token still works
+        add(instance.token.jti, instance.token.expires_at)
+
+
+def is_synced():
+    return redis_enabled() and get_redis().zscore(BLACKLIST_KEY, SYNCED_MEMBER) is not None
+
+
+def rebuild(chunk_size=5000):
+    """
+    Rebuild the mirror from the database and mark it trusted.
+
+    Returns:
+        Number of blacklisted tokens mirrored
+    """
+    client = get_redis()
+    # Unique per run so a background rebuild and the nightly one cannot mix
+    staging_key = f"{BLACKLIST_KEY}:rebuild:{uuid.uuid4().hex}"
+    started = aware_utcnow()
+
+    client.delete(staging_key)
+    rows = BlacklistedToken.objects.filter(token__expires_at__gt=started).values_list(
+        "token__jti", "token__expires_at"
+    )
+    count = 0
+    batch = {}
+    for jti, expires_at in rows.iterator(chunk_size=chunk_size):
+        batch[jti] = expires_at.timestamp()
+        if len(batch) >= chunk_size:
+            client.zadd(staging_key, batch)
+            count += len(batch)
+            batch = {}
+    batch[SYNCED_MEMBER] = float("inf")
+    client.zadd(staging_key, batch)
+    count += len(batch) - 1
+    client.rename(staging_key, BLACKLIST_KEY)
+
+    # Tokens blacklisted while we were reading went to the old key
+    late = BlacklistedToken.objects.filter(blacklisted_at__gte=started).values_list(
+        "token__jti", "token__expires_at"
+    )
+    late = {jti: expires_at.timestamp() for jti, expires_at in late}
+    if late:
+        client.zadd(BLACKLIST_KEY, late)
+    return count + len(late)
+
+
+def prune_cache():
+    """Drop mirrored tokens that have expired; returns how many."""
+    return get_redis().zremrangebyscore(BLACKLIST_KEY, "-inf", time.time())
+
+
+def prune_database(batch_size=1000, pause=0.0, dry_run=False):
+    """
+    Delete expired outstanding tokens (and their blacklist rows) in batches.
+
+    Expired refresh tokens fail validation on their own, so their rows are
+    dead weight. Each batch is its own short transaction.
+
+    Returns:
+        (outstanding_deleted, blacklisted_deleted)
+    """
+    cutoff = aware_utcnow()
+    expired = OutstandingToken.objects.filter(expires_at__lte=cutoff)
+    if dry_run:
+        return expired.count(), BlacklistedToken.objects.filter(token__expires_at__lte=cutoff).count()
+
+    outstanding_deleted = blacklisted_deleted = 0
+    while True:
+        ids = list(expired.order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            blacklisted, _ = BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            outstanding, _ = OutstandingToken.objects.filter(id__in=ids).delete()
+        blacklisted_deleted += blacklisted
+        outstanding_deleted += outstanding
+        if pause:
+            time.sleep(pause)
+    return outstanding_deleted, blacklisted_deleted
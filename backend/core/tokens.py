@@ -1,5 +1,8 @@
 from django.core.signing import TimestampSigner, BadSignature, SignatureExpired
 from django.conf import settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken as BaseRefreshToken
 import logging
 
 logger = logging.getLogger(__name__)
@@ -90,3 +93,20 @@ def verify_password_reset_token(token):
             logger.warning(f"User {user_id} not found for password reset token")
     return None
 
+
+class RefreshToken(BaseRefreshToken):
+    """
+    Refresh token whose blacklist check tries the Redis mirror first.
+
+    Falls back to simplejwt's table lookup whenever the mirror cannot give
+    an answer (see core/token_blacklist.py).
+    """
+
+    def check_blacklist(self):
+        from . import token_blacklist
+
+        blacklisted = token_blacklist.is_blacklisted(self.payload[api_settings.JTI_CLAIM])
+        if blacklisted is None:
+            return super().check_blacklist()
+        if blacklisted:
+            raise TokenError("Token is blacklisted")
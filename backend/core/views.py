@@ -1,8 +1,7 @@
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from django.db import transaction
 import logging
@@ -24,12 +23,17 @@ from .serializers import (
     PasswordResetConfirmSerializer
 )
 from .tokens import (
+    RefreshToken,
     generate_email_verification_token,
     verify_email_verification_token,
     generate_password_reset_token,
     verify_password_reset_token
 )
 from .emails import send_verification_email, send_password_reset_email
+from .auth import add_user_claims, set_auth_cookies
+from . import lockout
+from .health import readiness
+from .throttling import ForgotPasswordThrottle
 
 
 from audit.middleware import AuditMiddleware
@@ -39,43 +43,15 @@ from django.conf import settings
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def health_check(request):
-    """Simple health check endpoint"""
-    from django.db import connection
-    from django.conf import settings
-    
-    # Test database connection
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-            db_status = "connected"
-    except Exception as e:
-        db_status = f"error: {str(e)}"
-    
-    # Test Redis connection
-    try:
-        import redis
-        r = redis.from_url(settings.REDIS_URL)
-        r.ping()
-        redis_status = "connected"
-    except Exception as e:
-        redis_status = f"error: {str(e)}"
-    
-    # Test User model
-    try:
-        from .models import User
-        user_count = User.objects.count()
-        user_status = f"connected - {user_count} users"
-    except Exception as e:
-        user_status = f"error: {str(e)}"
-    
+    """Dependency status as last seen by the background prober (core/health.py)"""
+    ready, checks = readiness()
+
     return Response({
-        'status': 'healthy',
-        'message': 'Backend is running properly',
-        'database': db_status,
-        'redis': redis_status,
-        'user_model': user_status,
+        'status': 'healthy' if ready else 'unhealthy',
+        'message': 'Backend is running properly' if ready else 'Some dependencies are unavailable',
+        'checks': checks,
         'debug_mode': settings.DEBUG
-    })
+    }, status=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
 
 
 @api_view(['GET'])
@@ -91,6 +67,35 @@ def connection_test(request):
     })
 
 
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def metrics(request):
+    """Prometheus metrics for this process (METRICS_TOKEN bearer or staff user)."""
+    import hmac
+    from django.http import HttpResponse
+    from rest_framework.exceptions import AuthenticationFailed
+    from .auth import CookieJWTAuthentication
+    from .cache import publish_stats
+    from .metrics import render_prometheus
+
+    # Authenticated by hand: a scraper's bearer token is not a JWT
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return Response({'detail': 'Invalid metrics token.'}, status=status.HTTP_401_UNAUTHORIZED)
+    else:
+        try:
+            result = CookieJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            result = None
+        if result is None or not result[0].is_staff:
+            return Response({'detail': 'Staff access required.'}, status=status.HTTP_403_FORBIDDEN)
+
+    publish_stats()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def test_register(request):
@@ -237,10 +242,11 @@ def login(request):
     
     if serializer.is_valid():
         user = serializer.validated_data['user']
+        lockout.clear(user.email)
         
         # Generate JWT tokens
         refresh = RefreshToken.for_user(user)
-        access_token = refresh.access_token
+        access_token = add_user_claims(refresh.access_token, user)
         
         # Create response with tokens in cookies
         response = Response({
@@ -249,27 +255,7 @@ def login(request):
         }, status=status.HTTP_200_OK)
         
         # Set HTTP-only cookies with proper settings for production
-        response.set_cookie(
-            'access_token',
-            str(access_token),
-            max_age=60 * 10,  # 10 minutes
-            httponly=True,
-            secure=not settings.DEBUG,  # Secure in production
-            samesite='Lax',
-            domain=None,  # Let browser handle domain
-            path='/'
-        )
-        
-        response.set_cookie(
-            'refresh_token',
-            str(refresh),
-            max_age=60 * 60 * 24 * 14,  # 14 days
-            httponly=True,
-            secure=not settings.DEBUG,  # Secure in production
-            samesite='Lax',
-            domain=None,  # Let browser handle domain
-            path='/'
-        )
+        set_auth_cookies(response, access_token, refresh)
         
         # Log audit event
         AuditMiddleware.log_event(
@@ -321,73 +307,7 @@ def logout(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
-def refresh_token(request):
-    """Refresh JWT tokens."""
-    refresh_token = request.COOKIES.get('refresh_token')
-    
-    if not refresh_token:
-        return Response({
-            'error': 'Refresh token not found.'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-    
-    try:
-        refresh = RefreshToken(refresh_token)
-        access_token = refresh.access_token
-        
-        # Create response with new access token
-        response = Response({
-            'message': 'Token refreshed successfully.'
-        }, status=status.HTTP_200_OK)
-        
-        response.set_cookie(
-            'access_token',
-            str(access_token),
-            max_age=60 * 10,  # 10 minutes
-            httponly=True,
-            secure=not settings.DEBUG,  # Secure in production
-            samesite='Lax',
-            domain=None,  # Let browser handle domain
-            path='/'
-        )
-        
-        return response
-        
-    except Exception as e:
-        logger.error(f"Token refresh error: {e}")
-        return Response({
-            'error': 'Invalid refresh token.'
-        }, status=status.HTTP_401_UNAUTHORIZED)
-
-
-@api_view(['GET', 'PATCH'])
-@permission_classes([IsAuthenticated])
-def profile(request):
-    """Get or update user profile."""
-    if request.method == 'GET':
-        serializer = UserProfileSerializer(request.user)
-        return Response(serializer.data)
-    
-    elif request.method == 'PATCH':
-        serializer = UserProfileSerializer(request.user, data=request.data, partial=True)
-        
-        if serializer.is_valid():
-            serializer.save()
-            
-            # Log audit event
-            AuditMiddleware.log_event(
-                user=request.user,
-                event_type='profile_updated',
-                request=request,
-                metadata=request.data
-            )
-            
-            return Response(serializer.data)
-        
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-
-@api_view(['POST'])
-@permission_classes([AllowAny])
+@throttle_classes([ForgotPasswordThrottle])
 def forgot_password(request):
     """Request password reset."""
     serializer = PasswordResetRequestSerializer(data=request.data)
@@ -435,6 +355,7 @@ def reset_password(request):
         if user:
             user.set_password(new_password)
             user.save()
+            lockout.clear(user.email)
             
             # Log audit event
             AuditMiddleware.log_event(
@@ -8,9 +8,9 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+from asgiref.sync import sync_to_async
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 from channels.security.websocket import AllowedHostsOriginValidator
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'neora.settings')
@@ -19,11 +19,42 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'neora.settings')
 # is populated before importing code that may import ORM models.
 django_asgi_app = get_asgi_application()
 
+from audit.buffer import flush_on_exit, install_sigterm_handler
+from core.channels_middleware import AdmissionControlMiddleware, CookieJWTAuthMiddleware
+from chat.services.export import start_export_recovery
+from core.health import prober
+from core.outbox import start_sender
 from neora.routing import websocket_urlpatterns
 
+# Flush buffered audit events when the platform stops this process
+install_sigterm_handler()
+# Warm the readiness results before the platform's first probe
+prober.start()
+# Restart background exports left behind by a crashed or restarted worker
+start_export_recovery()
+# Send mail queued, or waiting to retry, before this process started
+start_sender()
+
+
+async def lifespan(scope, receive, send):
+    """ASGI lifespan, for servers that send it (uvicorn, hypercorn; not daphne)."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # Write buffered audit events while the server still waits on us
+            await sync_to_async(flush_on_exit)()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
-    "websocket": AuthMiddlewareStack(
-        URLRouter(websocket_urlpatterns)
+    "lifespan": lifespan,
+    "websocket": AdmissionControlMiddleware(
+        CookieJWTAuthMiddleware(
+            URLRouter(websocket_urlpatterns)
+        )
     ),
 })
@@ -0,0 +1,82 @@
+"""
+Channel layer sharded across several Redis instances.
+
+channels_redis already spreads groups and channels over multiple hosts, but
+it splits a 12-bit CRC range evenly between them, so adding a host moves
+about half of all keys. This layer places hosts on a hash ring with virtual
+nodes instead: adding an Nth shard only moves ~1/N of the ``user_{id}``
+groups. Configure it through CHANNEL_REDIS_URLS (see settings).
+"""
+
+import bisect
+import hashlib
+from urllib.parse import urlsplit
+
+from channels_redis.core import RedisChannelLayer
+
+from core import metrics
+
+VIRTUAL_NODES = 160
+
+metrics.describe("neora_channel_layer_publish_total", "Messages written to each channel-layer shard")
+
+
+def _hash(value):
+    if isinstance(value, str):
+        value = value.encode("utf8")
+    return int.from_bytes(hashlib.md5(value, usedforsecurity=False).digest()[:8], "big")
+
+
+def shard_name(host):
+    """Stable, credential-free name for a Redis host (used as its ring identity)."""
+    if "address" in host:
+        parts = urlsplit(host["address"])
+        return f"{parts.hostname}:{parts.port or 6379}{parts.path or '/0'}"
+    if "master_name" in host:
+        return f"sentinel:{host['master_name']}"
+    return f"{host.get('host', 'localhost')}:{host.get('port', 6379)}/{host.get('db', 0)}"
+
+
+class HashRing:
+    def __init__(self, nodes, virtual_nodes=VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"{node}#{replica}"), index)
+            for index, node in enumerate(nodes)
+            for replica in range(virtual_nodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._indexes = [index for _, index in points]
+
+    def get(self, value):
+        position = bisect.bisect(self._hashes, _hash(value)) % len(self._hashes)
+        return self._indexes[position]
+
+
+class ShardedRedisChannelLayer(RedisChannelLayer):
+    """RedisChannelLayer with ring-based shard selection and per-shard publish counters."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard_names = [shard_name(host) for host in self.hosts]
+        self.ring = HashRing(self.shard_names)
+
+    def consistent_hash(self, value):
+        if self.ring_size == 1:
+            return 0
+        # RedisChannelLayer.send() hashes the full "specific.X!abc" name while
+        # receive_single() hashes the "specific.X!" prefix it listens on; hash
+        # the prefix for both so messages land on the shard that is read
+        if "!" in value:
+            value = self.non_local_name(value)
+        return self.ring.get(value)
+
+    async def send(self, channel, message):
+        await super().send(channel, message)
+        shard = self.shard_names[self.consistent_hash(channel)] if "!" in channel else "any"
+        metrics.incr("neora_channel_layer_publish_total", shard=shard)
+
+    def _map_channel_keys_to_connection(self, channel_names, message):
+        mapping = super()._map_channel_keys_to_connection(channel_names, message)
+        for index, channel_keys in mapping[0].items():
+            metrics.incr("neora_channel_layer_publish_total", len(channel_keys), shard=self.shard_names[index])
+        return mapping
@@ -0,0 +1,162 @@
+"""
+Database routing between the primary and optional read replicas.
+
+Replicas are configured as DATABASES aliases named ``replica*`` (see
+DATABASE_REPLICA_URLS in settings). Reads only go to a replica when a view
+opts in with ``read_from_replica()`` -- or for audit models, which are
+append-only -- and a user who just wrote is pinned to the primary for
+DB_READ_YOUR_WRITES_SECONDS so they always read their own writes.
+"""
+
+import logging
+import random
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+import redis
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.redis_client import get_async_redis, get_redis, redis_enabled
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PREFIX = "replica"
+PIN_KEY = "db:primary-pin:{}"
+
+# Alias chosen by the innermost read_from_replica() block, if any
+_read_alias = ContextVar("db_read_alias", default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def pin_to_primary(user_id):
+    """
+    Send this user's reads to the primary for the read-your-writes window.
+
+    The pin lives in Redis so every worker sees it; the per-process cache is
+    only used when REDIS_URL is not a Redis server (a single dev process).
+    """
+    if not (user_id and replica_aliases()):
+        return
+    key, seconds = PIN_KEY.format(user_id), settings.DB_READ_YOUR_WRITES_SECONDS
+    if not redis_enabled():
+        cache.set(key, 1, seconds)
+        return
+    try:
+        get_redis().set(key, 1, ex=seconds)
+    except redis.RedisError as e:
+        logger.warning(f"Could not pin user {user_id} to the primary: {e}")
+
+
+def is_pinned(user_id):
+    if not user_id:
+        return False
+    if not redis_enabled():
+        return cache.get(PIN_KEY.format(user_id)) is not None
+    try:
+        return bool(get_redis().exists(PIN_KEY.format(user_id)))
+    except redis.RedisError:
+        # Unknown, so read from the primary
+        return True
+
+
+async def ais_pinned(user_id):
+    if not user_id:
+        return False
+    if not redis_enabled():
+        return await cache.aget(PIN_KEY.format(user_id)) is not None
+    try:
+        return bool(await get_async_redis().exists(PIN_KEY.format(user_id)))
+    except redis.RedisError:
+        return True
+
+
+@contextmanager
+def read_from_replica(user_id=None):
+    """
+    Route reads inside the block to a replica.
+
+    Falls back to the primary when no replica is configured or when the
+    user wrote recently. Querysets must be evaluated inside the block.
+    """
+    aliases = replica_aliases()
+    alias = None
+    if aliases and not is_pinned(user_id):
+        alias = random.choice(aliases)
+    token = _read_alias.set(alias)
+    try:
+        yield alias or DEFAULT_DB_ALIAS
+    finally:
+        _read_alias.reset(token)
+
+
+@asynccontextmanager
+async def aread_from_replica(user_id=None):
+    """read_from_replica() for async views; the pin lookup does not block the event loop."""
+    aliases = replica_aliases()
+    alias = None
+    if aliases and not await ais_pinned(user_id):
+        alias = random.choice(aliases)
+    token = _read_alias.set(alias)
+    try:
+        yield alias or DEFAULT_DB_ALIAS
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_lag(alias):
+    """
+    Seconds the replica is behind the primary, or None if unknown.
+
+    Only PostgreSQL streaming replicas report lag; an idle replica can show
+    growing lag since it measures time since the last replayed transaction.
+    """
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN pg_is_in_recovery() "
+            "THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) "
+            "ELSE 0 END"
+        )
+        row = cursor.fetchone()
+    return float(row[0]) if row and row[0] is not None else None
+
+
+def replica_status():
+    status = {}
+    for alias in replica_aliases():
+        try:
+            status[alias] = {"status": "connected", "lag_seconds": replica_lag(alias)}
+        except Exception as e:
+            status[alias] = {"status": f"error: {str(e)}", "lag_seconds": None}
+    return status
+
+
+class PrimaryReplicaRouter:
+    """Writes always go to the primary; opted-in reads go to a replica."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias:
+            return alias
+        if model._meta.app_label == "audit":
+            aliases = replica_aliases()
+            if aliases:
+                return random.choice(aliases)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any alias may relate
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
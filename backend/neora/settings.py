@@ -68,7 +68,6 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'channels',
-    'axes',
     'csp',
 
     # Local apps
@@ -86,7 +85,6 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    # 'axes.middleware.AxesMiddleware',
     # 'csp.middleware.CSPMiddleware',
     # 'audit.middleware.AuditMiddleware',
 ]
@@ -134,15 +132,86 @@ elif os.getenv('POSTGRES_HOST'):
 else:
     DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3'}}
 
+# Optional read replicas, e.g. DATABASE_REPLICA_URLS=postgres://...,postgres://...
+for _index, _url in enumerate(_listenv('DATABASE_REPLICA_URLS'), start=1):
+    DATABASES[f'replica{_index}'] = {**dj_database_url.parse(_url), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['neora.db_router.PrimaryReplicaRouter']
+# How long a user's reads stick to the primary after they write
+DB_READ_YOUR_WRITES_SECONDS = int(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '5'))
+
 # ---------- Channels / Redis ----------
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-if REDIS_URL.startswith('redis://'):
-    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels_redis.core.RedisChannelLayer', 'CONFIG': {'hosts': [REDIS_URL]}}}
+# Comma-separated Redis URLs the channel layer shards user groups across
+# (consistent hashing); defaults to REDIS_URL alone
+CHANNEL_REDIS_URLS = [u.strip() for u in os.getenv('CHANNEL_REDIS_URLS', '').split(',') if u.strip()] or [REDIS_URL]
+if CHANNEL_REDIS_URLS[0].startswith('redis://'):
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'neora.channel_layers.ShardedRedisChannelLayer', 'CONFIG': {'hosts': CHANNEL_REDIS_URLS}}}
 else:
     CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
 
+# ---------- WebSockets ----------
+# Validated JWT -> user snapshots kept by the websocket auth middleware
+WS_AUTH_CACHE_TTL = int(os.getenv('WS_AUTH_CACHE_TTL', '60'))
+WS_AUTH_CACHE_SIZE = int(os.getenv('WS_AUTH_CACHE_SIZE', '10000'))
+# Per-message delta logs kept so a reconnecting client can resume a reply
+STREAM_REPLAY_TTL = int(os.getenv('STREAM_REPLAY_TTL', '300'))
+STREAM_REPLAY_MAXLEN = int(os.getenv('STREAM_REPLAY_MAXLEN', '5000'))
+# Server heartbeats; sockets silent for WS_IDLE_TIMEOUT seconds are closed
+WS_HEARTBEAT_INTERVAL = float(os.getenv('WS_HEARTBEAT_INTERVAL', '25'))
+WS_IDLE_TIMEOUT = float(os.getenv('WS_IDLE_TIMEOUT', '75'))
+# Oldest socket is closed when a user opens more than this many
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv('WS_MAX_CONNECTIONS_PER_USER', '5'))
+# Seconds an unauthenticated socket may stay open; 0 rejects them outright
+WS_ANONYMOUS_TIMEOUT = float(os.getenv('WS_ANONYMOUS_TIMEOUT', '10'))
+# Single daphne process: stream events skip the channel layer, and the
+# resume log lives in process memory instead of Redis
+WS_SINGLE_PROCESS = os.getenv('WS_SINGLE_PROCESS', 'false').lower() == 'true'
+# Outbound events buffered per socket before deltas are merged
+WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', '64'))
+# Per-process token bucket for websocket handshakes; excess connects are
+# closed with 4429 and a jittered retry-after hint
+WS_ADMISSION_RATE = float(os.getenv('WS_ADMISSION_RATE', '50'))
+WS_ADMISSION_BURST = int(os.getenv('WS_ADMISSION_BURST', '100'))
+WS_ADMISSION_JITTER = float(os.getenv('WS_ADMISSION_JITTER', '5'))
+WS_ADMISSION_MAX_RETRY = float(os.getenv('WS_ADMISSION_MAX_RETRY', '60'))
+
+# ---------- Server-Sent Events ----------
+# Keepalive comment interval, client reconnect delay and max stream lifetime
+SSE_KEEPALIVE_SECONDS = float(os.getenv('SSE_KEEPALIVE_SECONDS', '15'))
+SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', '3000'))
+SSE_MAX_DURATION = float(os.getenv('SSE_MAX_DURATION', '300'))
+
 # ---------- Cache ----------
-CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# With Redis, every alias is a per-process L1 in front of shared Redis, kept
+# coherent across workers by pub/sub invalidation (core/cache.py); without
+# it, a plain per-process LocMemCache. Add an alias here for each new cache.
+CACHE_L1_MAX_ENTRIES = int(os.getenv('CACHE_L1_MAX_ENTRIES', '1000'))
+CACHE_L1_TIMEOUT = float(os.getenv('CACHE_L1_TIMEOUT', '5'))
+CACHE_L1_JITTER = float(os.getenv('CACHE_L1_JITTER', '0.2'))
+
+
+def _cache(prefix):
+    if not REDIS_URL.startswith(('redis://', 'rediss://')):
+        return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': prefix}
+    return {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': prefix,
+        'OPTIONS': {
+            'L1_MAX_ENTRIES': CACHE_L1_MAX_ENTRIES,
+            'L1_TIMEOUT': CACHE_L1_TIMEOUT,
+            'L1_JITTER': CACHE_L1_JITTER,
+        },
+    }
+
+
+CACHES = {
+    'default': _cache('default'),
+    'profile': _cache('profile'),
+    'history': _cache('history'),
+    'tokens': _cache('tokens'),
+}
 
 # ---------- Auth / Passwords ----------
 AUTH_PASSWORD_VALIDATORS = [
@@ -151,6 +220,20 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator'},
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
+# Hasher cost (core/hashers.py); stored hashes are upgraded on the next login
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2_sha256')
+PASSWORD_PBKDF2_ITERATIONS = int(os.getenv('PASSWORD_PBKDF2_ITERATIONS', '1000000'))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', str(2 ** 14)))
+_HASHERS = {
+    'pbkdf2_sha256': 'core.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'core.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [_HASHERS[PASSWORD_HASHER]] + [h for name, h in _HASHERS.items() if name != PASSWORD_HASHER] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+# Bounded pool that runs login/register/reset off the request thread
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '64'))
 
 # ---------- I18N ----------
 LANGUAGE_CODE = os.getenv('LANGUAGE_CODE', 'en')
@@ -179,12 +262,29 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
-    'PAGE_SIZE': 50
+    'PAGE_SIZE': 50,
+    # Proxies in front of the app; throttling takes the client IP from
+    # X-Forwarded-For at this depth (unset: the whole header)
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES')) if os.getenv('NUM_PROXIES') else None,
 }
 if DEBUG:
     REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = []
     REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {}
 
+# ---------- Throttling ----------
+# Token buckets shared across workers through Redis (per-process without
+# it). "N/period" allows bursts of N refilled at N per period. Auth scopes
+# are keyed by client IP, chat scopes by user.
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'true').lower() == 'true'
+THROTTLE_RATES = {
+    'login': os.getenv('THROTTLE_RATE_LOGIN', '10/min'),
+    'register': os.getenv('THROTTLE_RATE_REGISTER', '5/hour'),
+    'forgot_password': os.getenv('THROTTLE_RATE_FORGOT_PASSWORD', '5/hour'),
+    'reset_password': os.getenv('THROTTLE_RATE_RESET_PASSWORD', '10/hour'),
+    'messages': os.getenv('THROTTLE_RATE_MESSAGES', '30/min'),
+    'voice': os.getenv('THROTTLE_RATE_VOICE', '10/min'),
+}
+
 # ---------- JWT ----------
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv('JWT_ACCESS_TTL', '10'))),
@@ -202,6 +302,9 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_PATH': '/',
     'AUTH_COOKIE_SAMESITE': 'None',
 }
+# Build request.user from access-token claims instead of a query per request;
+# claim changes reach a session within one access-token lifetime
+JWT_CLAIMS_AUTH = os.getenv('JWT_CLAIMS_AUTH', 'false').lower() == 'true'
 
 # ---------- CORS / CSRF cookies ----------
 # Note: If your frontend reads the CSRF cookie to echo it in X-CSRFToken,
@@ -240,18 +343,17 @@ CONTENT_SECURITY_POLICY = {
     }
 }
 
-# ---------- Axes ----------
-AUTHENTICATION_BACKENDS = [
-    'axes.backends.AxesStandaloneBackend',
-    'django.contrib.auth.backends.ModelBackend',
-]
+# ---------- Login lockout ----------
+# Failed logins per email and per client IP, over a sliding window kept in
+# Redis (see core/lockout.py); an IP gets more room since NAT and shared
+# networks put many users behind one address
 if DEBUG:
-    AXES_FAILURE_LIMIT = 20
-    AXES_COOLOFF_TIME = 0.1  # 6 minutes
-    AXES_ENABLE_ADMIN = True
+    LOGIN_LOCKOUT_EMAIL_LIMIT = 20
+    LOGIN_LOCKOUT_WINDOW = 360  # 6 minutes
 else:
-    AXES_FAILURE_LIMIT = 5
-    AXES_COOLOFF_TIME = 1  # 1 hour
+    LOGIN_LOCKOUT_EMAIL_LIMIT = int(os.getenv('LOGIN_LOCKOUT_EMAIL_LIMIT', '5'))
+    LOGIN_LOCKOUT_WINDOW = int(os.getenv('LOGIN_LOCKOUT_WINDOW', '3600'))  # 1 hour
+LOGIN_LOCKOUT_IP_LIMIT = int(os.getenv('LOGIN_LOCKOUT_IP_LIMIT', '50'))
 
 # ---------- Email ----------
 EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
@@ -261,6 +363,15 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'true').lower() == 'true'
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@neora.com')
+# Outbox sender (core/outbox.py): batch size, retries (backoff doubles from
+# RETRY_BASE up to RETRY_MAX seconds) and SMTP connection reuse
+EMAIL_OUTBOX_IN_PROCESS = os.getenv('EMAIL_OUTBOX_IN_PROCESS', 'true').lower() == 'true'
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '50'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', '6'))
+EMAIL_OUTBOX_RETRY_BASE = float(os.getenv('EMAIL_OUTBOX_RETRY_BASE', '30'))
+EMAIL_OUTBOX_RETRY_MAX = float(os.getenv('EMAIL_OUTBOX_RETRY_MAX', '3600'))
+EMAIL_OUTBOX_POLL_INTERVAL = float(os.getenv('EMAIL_OUTBOX_POLL_INTERVAL', '30'))
+EMAIL_OUTBOX_IDLE_DISCONNECT = float(os.getenv('EMAIL_OUTBOX_IDLE_DISCONNECT', '60'))
 
 # ---------- Frontend/Backend links ----------
 # (already defined above; kept here for compatibility)
@@ -275,6 +386,33 @@ N8N_API_KEY_VALUE = os.getenv('N8N_API_KEY_VALUE', '')
 # ---------- Transcription ----------
 ENABLE_TRANSCRIPTION = os.getenv('ENABLE_TRANSCRIPTION', 'false').lower() == 'true'
 
+# ---------- Chat history export / import ----------
+CHAT_EXPORT_CHUNK_SIZE = int(os.getenv('CHAT_EXPORT_CHUNK_SIZE', '2000'))
+# Background exports without a heartbeat for this long are restarted
+CHAT_EXPORT_STALE_AFTER = float(os.getenv('CHAT_EXPORT_STALE_AFTER', '120'))
+CHAT_IMPORT_BATCH_SIZE = int(os.getenv('CHAT_IMPORT_BATCH_SIZE', '1000'))
+
+# ---------- Audit log ----------
+# Events are buffered per process and bulk-written by a background thread
+# (audit/buffer.py); overflow policy: write_through, drop_oldest, drop_newest
+AUDIT_BUFFERED = os.getenv('AUDIT_BUFFERED', 'true').lower() == 'true'
+AUDIT_BUFFER_MAX = int(os.getenv('AUDIT_BUFFER_MAX', '10000'))
+AUDIT_FLUSH_SIZE = int(os.getenv('AUDIT_FLUSH_SIZE', '200'))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', '1'))
+AUDIT_OVERFLOW_POLICY = os.getenv('AUDIT_OVERFLOW_POLICY', 'write_through')
+
+# ---------- Health probes ----------
+# Dependencies are checked in the background; /ready fails when a check in
+# HEALTH_READY_CHECKS failed or its result is older than HEALTH_STALE_AFTER
+HEALTH_PROBE_INTERVAL = float(os.getenv('HEALTH_PROBE_INTERVAL', '10'))
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', '5'))
+HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', '60'))
+HEALTH_READY_CHECKS = _listenv('HEALTH_READY_CHECKS', 'database,redis,channel_layer')
+
+# ---------- Metrics ----------
+# Bearer token for scraping /api/metrics; without it only staff users may read them
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 # ---------- Logging ----------
 LOGGING = {
     'version': 1,
@@ -20,28 +20,16 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
 
+from core import async_views as core_async_views
+
 def root_view(request):
     """Root endpoint for the API"""
-    from django.db import connection
-    from django.conf import settings
-    
-    # Test database connection
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT 1")
-            db_status = "connected"
-    except Exception as e:
-        db_status = f"error: {str(e)}"
-    
     return JsonResponse({
         'message': 'NEORA AI Executive Assistant API',
         'version': '1.0.0',
-        'debug': {
-            'database': db_status,
-            'debug_mode': settings.DEBUG,
-            'allowed_hosts': settings.ALLOWED_HOSTS,
-        },
         'endpoints': {
+            'live': '/live',
+            'ready': '/ready',
             'health': '/api/health',
             'admin': '/admin/',
             'api': '/api/'
@@ -50,6 +38,8 @@ def root_view(request):
 
 urlpatterns = [
     path('', root_view, name='root'),
+    path('live', core_async_views.live, name='live'),
+    path('ready', core_async_views.ready, name='ready'),
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
     path('api/', include('chat.urls')),
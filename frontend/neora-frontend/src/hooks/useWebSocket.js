@@ -61,6 +61,11 @@ export const useWebSocket = (endpoint = '/stream') => {
       wsRef.current.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+          // Answer server heartbeats so the socket is not reaped as idle
+          if (data.type === 'heartbeat') {
+            wsRef.current?.send(JSON.stringify({ type: 'pong', timestamp: data.timestamp }));
+            return;
+          }
           setLastMessage(data);
         } catch (err) {
           console.error('Failed to parse WebSocket message:', err);